@@ -0,0 +1,137 @@
+from collections import deque
+from typing import Hashable, Iterable, Iterator
+
+from data_structures.trie import Trie, EmptyInputException
+from types_extensions import void, const, safe_type, string_like, list_type, tuple_type
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher. The patterns are compiled into an Aho-Corasick automaton: a trie of the patterns plus, for
+    every node, a failure link (the longest proper suffix of the node's string which is also a trie path) and an
+    output link (the nearest node along the failure links which ends a pattern). Any text is then scanned in a single
+    pass, regardless of the number of patterns, and every occurrence of every pattern is reported, overlaps included.
+
+    Patterns are either all str or all bytes, and so is the scanned text. Matching is exact. When compiled from a
+    Trie the patterns are casefolded, so use `casefold=True` (offsets then refer to the casefolded text).
+
+    The scan state is carried over between chunks, so matches spanning chunk boundaries are found as well:
+
+    >>> matcher = AhoCorasick([b'ERROR', b'timeout'])
+    >>> for offset, pattern in matcher.scan_file('/var/log/huge.log'):
+    >>>     ...
+    """
+
+    def __init__(self, patterns: Iterable[string_like], casefold: bool = False) -> void:
+        """
+        :param patterns: The patterns to look for. Duplicates are ignored.
+        :param casefold: Casefold str text before scanning it
+        """
+        self.casefold: const(bool) = casefold
+        self._goto: list_type[dict[Hashable, int]] = [{}]
+        self._fail: list_type[int] = [0]
+        self._output: list_type[safe_type(string_like)] = [None]
+        self._output_link: list_type[int] = [0]
+        self._pattern_type: safe_type(type) = None
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    @classmethod
+    def from_trie(cls, trie: Trie) -> 'AhoCorasick':
+        """
+        Compile all words of a Trie (or any of its variants) into a matcher. Text is casefolded while scanning, to
+        match the way the Trie stores its words.
+        """
+        patterns = (word for head in trie.heads.values() for word in head.iter_collect(head.character))
+        return cls(patterns, casefold=True)
+
+    @property
+    def state_count(self) -> int:
+        return len(self._goto)
+
+    def _add(self, pattern: string_like) -> void:
+        if len(pattern) == 0:
+            raise EmptyInputException
+        if self._pattern_type is None:
+            self._pattern_type = type(pattern)
+        elif not isinstance(pattern, self._pattern_type):
+            raise TypeError(f"All patterns must be {self._pattern_type.__name__}, got {type(pattern).__name__}")
+        state = 0
+        for element in pattern:
+            next_state = self._goto[state].get(element)
+            if next_state is None:
+                next_state = self._goto[state][element] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._output_link.append(0)
+            state = next_state
+        self._output[state] = pattern
+
+    def _link(self) -> void:
+        # Breadth-first, so the failure target of a node (which is always shallower) is linked before the node
+        goto, fail, output, output_link = self._goto, self._fail, self._output, self._output_link
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for element, next_state in goto[state].items():
+                queue.append(next_state)
+                target = fail[state]
+                while target and element not in goto[target]:
+                    target = fail[target]
+                target = goto[target].get(element, 0)
+                fail[next_state] = target if target != next_state else 0
+                target = fail[next_state]
+                output_link[next_state] = target if output[target] is not None else output_link[target]
+
+    def scan_stream(self, chunks: Iterable[string_like]) -> Iterator[tuple_type[int, string_like]]:
+        """
+        Scan a stream of chunks as if it were a single text.
+
+        :return: A generator of (offset of the match in the whole stream, pattern), in the order the matches end
+        """
+        goto, fail, output, output_link = self._goto, self._fail, self._output, self._output_link
+        state = 0
+        offset = 0
+        for chunk in chunks:
+            if self.casefold and isinstance(chunk, str):
+                chunk = chunk.casefold()
+            for i, element in enumerate(chunk, offset):
+                transitions = goto[state]
+                while state and element not in transitions:
+                    state = fail[state]
+                    transitions = goto[state]
+                state = transitions.get(element, 0)
+                match = state if output[state] is not None else output_link[state]
+                while match:
+                    pattern = output[match]
+                    yield i - len(pattern) + 1, pattern
+                    match = output_link[match]
+            offset += len(chunk)
+
+    def scan(self, text: string_like) -> Iterator[tuple_type[int, string_like]]:
+        """
+        :return: A generator of (offset, pattern) for every occurrence of every pattern in the text
+        """
+        return self.scan_stream((text,))
+
+    def scan_file(self, path: str, chunk_size: int = 1 << 20,
+                  encoding: str = None) -> Iterator[tuple_type[int, string_like]]:
+        """
+        Scan a file chunk by chunk, so it never has to fit in memory.
+
+        :param path: The file to scan
+        :param chunk_size: Bytes (or characters) read at a time
+        :param encoding: Read the file as text with this encoding (for str patterns). Leave blank for bytes patterns.
+        Offsets are then in characters.
+        """
+        mode = 'rb' if encoding is None else 'r'
+        with open(path, mode, encoding=encoding) as file_h:
+            yield from self.scan_stream(iter(lambda: file_h.read(chunk_size), b'' if encoding is None else ''))
+
+    def __str__(self) -> str:
+        return f"AhoCorasick(states={self.state_count})"
+
+    def __repr__(self) -> str:
+        return str(self)
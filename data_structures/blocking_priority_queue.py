@@ -0,0 +1,136 @@
+import time
+from queue import Empty, Full
+from threading import Condition, Lock
+from typing import Generator
+
+from data_structures.maxheap import MaxHeap, HeapEntry
+from types_extensions import void, Number_t, safe_type, list_type
+
+
+class BlockingPriorityQueue:
+    """
+    A thread-safe priority queue backed by a MaxHeap. Consumers sleep on a condition while the queue is empty and, if
+    a capacity is given, producers sleep while it is full. The largest entry is always handed out first.
+
+    Closing the queue rejects new entries, but whatever is already queued can still be drained. Once it is empty,
+    blocked and future consumers get a PriorityQueueClosed exception (or, when iterating, the loop simply ends).
+
+    Usage with goroutines:
+
+    >>> queue_ = BlockingPriorityQueue(capacity=1000)
+    >>>
+    >>> def worker(q: BlockingPriorityQueue):
+    >>>     for entry in q:  # Sleeps until something is queued, stops once closed and drained
+    >>>         handle(entry)
+    >>>
+    >>> routines = [go(worker, None, queue_) for _ in range(4)]
+    >>> queue_.put(SomeEntry(10))
+    >>> queue_.close()
+    """
+
+    def __init__(self, capacity: int = 0) -> void:
+        """
+        :param capacity: Maximum number of queued entries. 0 or less means unbounded.
+        """
+        self.capacity: int = capacity
+        self._heap: MaxHeap = MaxHeap()
+        self._lock: Lock = Lock()
+        self._not_empty: Condition = Condition(self._lock)
+        self._not_full: Condition = Condition(self._lock)
+        self._closed: bool = False
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+    def _is_full(self) -> bool:
+        return 0 < self.capacity <= len(self._heap)
+
+    @staticmethod
+    def _wait(condition: Condition, deadline: safe_type(float)) -> bool:
+        if deadline is None:
+            condition.wait()
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        condition.wait(remaining)
+        return True
+
+    def put(self, entry: HeapEntry, block: bool = True, timeout: Number_t = None) -> void:
+        """
+        Queue an entry. If the queue is at capacity, either wait for room (optionally up to `timeout` seconds) or raise
+        queue.Full straight away when `block` is False.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._not_full:
+            while not self._closed and self._is_full():
+                if not block or not self._wait(self._not_full, deadline):
+                    raise Full
+            if self._closed:
+                raise PriorityQueueClosed
+            self._heap.insert(entry)
+            self._not_empty.notify()
+
+    def get(self, block: bool = True, timeout: Number_t = None) -> HeapEntry:
+        """
+        Take the largest entry. If the queue is empty, either wait for one (optionally up to `timeout` seconds) or
+        raise queue.Empty straight away when `block` is False.
+        """
+        return self.get_batch(1, block=block, timeout=timeout)[0]
+
+    def get_batch(self, n: int, block: bool = True, timeout: Number_t = None) -> list_type[HeapEntry]:
+        """
+        Take up to n of the largest entries, in order, under a single lock acquisition. Only waits while the queue is
+        completely empty, so a partial batch is returned as soon as anything is available.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._not_empty:
+            while len(self._heap) == 0:
+                if self._closed:
+                    raise PriorityQueueClosed
+                if not block or not self._wait(self._not_empty, deadline):
+                    raise Empty
+            rv = [self._heap.pop() for _ in range(min(n, len(self._heap)))]
+            self._not_full.notify(len(rv))
+            return rv
+
+    def peek(self) -> safe_type(HeapEntry):
+        with self._lock:
+            return self._heap.peek()
+
+    def close(self) -> void:
+        """
+        Stop accepting entries and wake every waiting producer and consumer.
+        """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def iter(self) -> Generator:
+        """
+        A blocking iterator which yields entries as they become available and ends once the queue is closed and empty.
+        """
+        while True:
+            try:
+                yield self.get()
+            except PriorityQueueClosed:
+                return
+
+    def __iter__(self) -> Generator:
+        return self.iter()
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class PriorityQueueClosed(Exception):
+
+    def __str__(self) -> str:
+        return "This priority queue is closed. No new entries are accepted and there is nothing left to get."
@@ -0,0 +1,150 @@
+import itertools
+from threading import Lock, get_ident
+from typing import Iterable
+
+from data_structures.trie import Trie, _TrieNode, EmptyInputException
+from types_extensions import void, const, safe_type, list_type
+
+
+class TrieBatch:
+    """
+    Do not instantiate directly, use ConcurrentTrie.batch().
+    A set of writes applied to a private copy of the trie. Every node on the path of a written word is copied the
+    first time the batch touches it (path copying), so the published nodes are never mutated. The new root is
+    published when the batch exits without an exception and discarded otherwise.
+    """
+
+    def __init__(self, trie: 'ConcurrentTrie') -> void:
+        self._trie: const(ConcurrentTrie) = trie
+        self._root: _TrieNode = trie._root
+        # Nodes created or copied by this batch, which can be mutated in place
+        self._owned: set[_TrieNode] = set()
+
+    def __enter__(self) -> 'TrieBatch':
+        if self._trie._writer == get_ident():
+            # Waiting for the lock would wait for ourselves, forever
+            raise NestedBatchException
+        self._trie._write_lock.acquire()
+        self._trie._writer = get_ident()
+        self._root = self._copy(self._trie._root)
+        return self
+
+    def __exit__(self, exc_type: type, *a, **k) -> void:
+        try:
+            if exc_type is None:
+                self._trie._publish(self._root)
+        finally:
+            self._owned = set()
+            self._trie._writer = None
+            self._trie._write_lock.release()
+
+    def _copy(self, node: _TrieNode) -> _TrieNode:
+        if node in self._owned:
+            return node
+        copy_ = _TrieNode(character=node.character)
+        copy_.children = dict(node.children)
+        copy_.size = node.size
+        copy_.complete = node.complete
+        self._owned.add(copy_)
+        return copy_
+
+    def _own_path(self, word: str) -> list_type[_TrieNode]:
+        """
+        Copy the existing nodes along the word into the batch's tree.
+
+        :return: The owned nodes for word[:0], word[:1]... for as long as the word exists in the trie
+        """
+        path = [self._root]
+        node = self._root
+        for char_ in word:
+            child = node.children.get(char_)
+            if child is None:
+                break
+            child = node.children[char_] = self._copy(child)
+            path.append(child)
+            node = child
+        return path
+
+    def insert(self, word: str) -> void:
+        if len(word) == 0:
+            raise EmptyInputException
+        word = word.casefold()
+        self._trie._validate(word)
+        path = self._own_path(word)
+        node = path[-1]
+        if node.insert(word, len(path) - 1):
+            for ancestor in path[:-1]:
+                ancestor.size += 1
+        # The nodes insert() created are brand new, so they belong to this batch as well
+        for i in range(len(path) - 1, len(word)):
+            node = node.children[word[i]]
+            self._owned.add(node)
+
+    def delete(self, word: str, delete_downstream: bool = False) -> bool:
+        if len(word) == 0:
+            raise EmptyInputException
+        word = word.casefold()
+        node = self._root.find(word, 0)
+        if node is None or not node.complete:
+            return False
+        _TrieNode._delete_path(self._own_path(word), delete_downstream)
+        return True
+
+
+class ConcurrentTrie(Trie):
+    """
+    Trie for many reader threads and few writers. Readers never lock: every read grabs the currently published root
+    once and works on it, and nothing reachable from a published root is ever modified. Writers serialize on a lock,
+    apply their changes to a path-copied version of the trie (see TrieBatch) and publish the new root with a single
+    attribute assignment, so readers see either all of a batch or none of it.
+
+    Searches are not cached, since a shared cache would need locking. Batch writes to amortize the path copying.
+    Batches don't nest: opening a batch, or calling insert()/delete(), inside a batch of the same thread raises
+    NestedBatchException. Make every write of the block through the outer batch instead.
+
+    >>> trie_ = ConcurrentTrie()
+    >>> with trie_.batch() as batch:
+    >>>     for word in new_words:
+    >>>         batch.insert(word)
+    """
+
+    def __init__(self, trie_charset: str | Iterable[str] = None, node_charset: str | Iterable[str] = None,
+                 cache_size: int = 0) -> void:
+        """
+        :param cache_size: Ignored, searches are never cached
+        """
+        super().__init__(trie_charset=trie_charset, node_charset=node_charset, cache_size=0)
+        self._write_lock: Lock = Lock()
+        # Thread id of the batch holding the write lock, if any
+        self._writer: safe_type(int) = None
+
+    def _publish(self, root: _TrieNode) -> void:
+        # heads is derived from the root, so this single assignment publishes everything
+        self._root = root
+
+    def batch(self) -> TrieBatch:
+        """
+        :return: A context manager which applies the writes made through it as a single atomic update
+        """
+        return TrieBatch(self)
+
+    def insert(self, word: str) -> void:
+        with self.batch() as batch:
+            batch.insert(word)
+
+    def delete(self, word: str, delete_downstream: bool = False) -> bool:
+        with self.batch() as batch:
+            return batch.delete(word, delete_downstream)
+
+    def search(self, word: str, insert_if_missing: bool = False, max_results: int = None) -> list_type[str]:
+        results = list(itertools.islice(self.iter_search(word), max_results or None))
+        if len(results) == 0 and insert_if_missing:
+            self.insert(word)
+        return results
+
+
+class NestedBatchException(Exception):
+
+    def __str__(self) -> str:
+        message = "This thread already has a batch open on this ConcurrentTrie. Write through that batch instead."
+        return message
@@ -0,0 +1,137 @@
+from typing import Any, Iterable, Iterator
+
+from data_structures.maxheap import MaxHeap, HeapEntry
+from types_extensions import void, Function, list_type
+
+
+class _RankedEntry(HeapEntry):
+    """
+    Do not use this class directly.
+    Wraps an arbitrary value for the heap utilities. Entries are ranked by (i, tiebreak), where i is the value's key.
+    """
+
+    __slots__ = ('tiebreak', 'value')
+
+    def __init__(self, i: Any, tiebreak: int, value: Any) -> void:
+        self.i: Any = i
+        self.tiebreak: int = tiebreak
+        self.value: Any = value
+
+    def __lt__(self, other: '_RankedEntry') -> bool:
+        if self.i == other.i:
+            return self.tiebreak < other.tiebreak
+        return self.i < other.i
+
+    def __le__(self, other: '_RankedEntry') -> bool:
+        return not other < self
+
+
+class _InvertedRankedEntry(_RankedEntry):
+    """
+    Do not use this class directly.
+    Same as _RankedEntry with the ranking inverted, so that the MaxHeap root is the smallest entry.
+    """
+
+    __slots__ = ()
+
+    def __lt__(self, other: '_RankedEntry') -> bool:
+        if self.i == other.i:
+            return other.tiebreak < self.tiebreak
+        return other.i < self.i
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def nlargest(iterable: Iterable[Any], k: int, key: Function = None) -> list_type[Any]:
+    """
+    Return the k largest values of an iterable, largest first, in O(n log k) time and O(k) memory.
+    Only a bounded heap of the best k values seen so far is kept. Its root is the worst of those values, so most
+    inputs are rejected after a single comparison. Ties keep the value that was seen first.
+
+    :param iterable: Any iterable, including unbounded generators (as long as they end eventually)
+    :param k: Number of results
+    :param key: Function mapping a value to its comparison key. Leave blank to compare the values themselves.
+    """
+    if k <= 0:
+        return []
+    key = key or _identity
+    heap = MaxHeap()
+    for order, value in enumerate(iterable):
+        entry = _InvertedRankedEntry(key(value), -order, value)
+        if heap.heap_size < k:
+            heap.insert(entry)
+        elif heap.data[0] < entry:
+            # Not better than the worst value kept so far
+            continue
+        else:
+            heap.replace(entry)
+    rv = []
+    while heap.heap_size > 0:
+        rv.append(heap.pop().value)
+    rv.reverse()
+    return rv
+
+
+def nsmallest(iterable: Iterable[Any], k: int, key: Function = None) -> list_type[Any]:
+    """
+    Return the k smallest values of an iterable, smallest first, in O(n log k) time and O(k) memory.
+    See nlargest() for details.
+    """
+    if k <= 0:
+        return []
+    key = key or _identity
+    heap = MaxHeap()
+    for order, value in enumerate(iterable):
+        entry = _RankedEntry(key(value), order, value)
+        if heap.heap_size < k:
+            heap.insert(entry)
+        elif heap.data[0] < entry:
+            # Not better than the worst value kept so far
+            continue
+        else:
+            heap.replace(entry)
+    rv = []
+    while heap.heap_size > 0:
+        rv.append(heap.pop().value)
+    rv.reverse()
+    return rv
+
+
+def merge(*sorted_iterables: Iterable[Any], key: Function = None, reverse: bool = False) -> Iterator[Any]:
+    """
+    Lazily merge several sorted iterables into a single sorted stream. Only one value per input is held at a time,
+    so memory is O(number of inputs) regardless of their length. Equal values are yielded in the order of the inputs
+    they came from.
+
+    Usage:
+
+    >>> list(merge([1, 4, 7], [2, 5], [3, 6, 9]))
+    [1, 2, 3, 4, 5, 6, 7, 9]
+
+    :param sorted_iterables: Inputs, each sorted ascending (or descending if `reverse` is set) by `key`
+    :param key: Function mapping a value to its comparison key. Leave blank to compare the values themselves.
+    :param reverse: The inputs are sorted in descending order, and so will be the output.
+    """
+    key = key or _identity
+    entry_type = _RankedEntry if reverse else _InvertedRankedEntry
+    heap = MaxHeap()
+    iterators = []
+    for idx, iterable in enumerate(sorted_iterables):
+        iterator = iter(iterable)
+        for value in iterator:
+            heap.insert(entry_type(key(value), -idx if reverse else idx, value))
+            break
+        iterators.append(iterator)
+
+    while heap.heap_size > 0:
+        top = heap.data[0]
+        yield top.value
+        for value in iterators[-top.tiebreak if reverse else top.tiebreak]:
+            # Reuse the root entry for the next value of the same input instead of allocating a new one
+            top.i, top.value = key(value), value
+            heap.max_heapify(0)
+            break
+        else:
+            heap.pop()
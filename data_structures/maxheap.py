@@ -1,7 +1,8 @@
+import itertools
 from abc import ABCMeta, abstractmethod
-from typing import Iterable, Union
+from typing import Iterable, Iterator, Union
 
-from types_extensions import void, Number_t, safe_type, list_type, tuple_type
+from types_extensions import void, const, Number_t, safe_type, list_type, tuple_type
 
 
 class HeapEntry(metaclass=ABCMeta):
@@ -41,44 +42,109 @@ class HeapEntry(metaclass=ABCMeta):
 class MaxHeap:
     """
     Heap struct with a list backend. Expects entries subclassed from HeapEntry. Can be initialized with an existing
-    unsorted list or empty. Inserts/deletes auto-heapify.
+    unsorted list or empty. Inserts/deletes keep the heap invariant by sifting a single entry up or down, so both are
+    O(log n). Bulk construction via heapify() or push_many() is O(n).
     """
 
     def __init__(self, data: list_type[HeapEntry] = None):
         self.data: list_type[HeapEntry] = data or []
-        self.heapsort()
+        self.heapify()
 
     @property
     def heap_size(self) -> int:
         return len(self.data)
 
-    def heapsort(self) -> void:
-        iterations = range(self.heap_size // 2 - 1, -1, -1)
-        for i in iterations:
+    def heapify(self) -> void:
+        """
+        Rebuild the heap invariant over the whole backing list in O(n) (bottom-up construction).
+        """
+        for i in range(self.heap_size // 2 - 1, -1, -1):
             self.max_heapify(i)
 
+    def heapsort(self) -> void:
+        """
+        Kept for backwards compatibility, use heapify() instead.
+        """
+        self.heapify()
+
     def max_heapify(self, root_idx: int = 0) -> void:
-        left = self._left(root_idx)
-        right = self._right(root_idx)
-        largest_idx = root_idx
-        if left < self.heap_size and self.data[left] > self.data[largest_idx]:
+        """
+        Float the entry at root_idx down until both of its children are smaller or equal.
+        The entry is held aside while larger children are moved up into the hole and written back once at the end.
+        """
+        data = self.data
+        size = len(data)
+        value = data[root_idx]
+        idx = root_idx
+        left = (idx << 0x01) + 1
+        while left < size:
             largest_idx = left
+            right = left + 1
+            if right < size and data[left] < data[right]:
+                largest_idx = right
+            if not value < data[largest_idx]:
+                break
+            data[idx] = data[largest_idx]
+            idx = largest_idx
+            left = (idx << 0x01) + 1
+        data[idx] = value
 
-        if right < self.heap_size and self.data[right] > self.data[largest_idx]:
-            largest_idx = right
-
-        if largest_idx != root_idx:
-            # If the tree is unbalanced in some way, float the initial root index down and heapify again
-            self.data[root_idx], self.data[largest_idx] = self.data[largest_idx], self.data[root_idx]
-            self.max_heapify(largest_idx)
+    def _sift_up(self, idx: int) -> void:
+        data = self.data
+        value = data[idx]
+        while idx > 0:
+            parent = (idx - 1) >> 0x01
+            if not data[parent] < value:
+                break
+            data[idx] = data[parent]
+            idx = parent
+        data[idx] = value
 
     def insert(self, value: HeapEntry) -> void:
-        self.data.insert(0, value)
-        self.heapsort()
+        self.data.append(value)
+        self._sift_up(self.heap_size - 1)
+
+    def push_many(self, values: Iterable[HeapEntry]) -> void:
+        """
+        Insert several entries at once. Small batches are sifted up one by one, large ones (relative to the current
+        heap size) are appended and the heap is rebuilt in a single O(n) pass.
+        """
+        old_size = self.heap_size
+        self.data.extend(values)
+        added = self.heap_size - old_size
+        if old_size == 0 or added * old_size.bit_length() > self.heap_size:
+            self.heapify()
+        else:
+            for idx in range(old_size, self.heap_size):
+                self._sift_up(idx)
 
     def pop(self) -> HeapEntry:
-        v = self.data.pop(0)
-        self.heapsort()
+        last = self.data.pop()
+        if not self.data:
+            return last
+        v = self.data[0]
+        self.data[0] = last
+        self.max_heapify(0)
+        return v
+
+    def pushpop(self, value: HeapEntry) -> HeapEntry:
+        """
+        Insert a value and pop the largest entry. Faster than insert() followed by pop().
+        If the value is at least as large as the current root it is returned straight away.
+        """
+        if self.data and value < self.data[0]:
+            value, self.data[0] = self.data[0], value
+            self.max_heapify(0)
+        return value
+
+    def replace(self, value: HeapEntry) -> HeapEntry:
+        """
+        Pop the largest entry and insert a value. Faster than pop() followed by insert().
+        Unlike pushpop(), the returned entry may be smaller than the inserted value.
+        """
+        v = self.data[0]
+        self.data[0] = value
+        self.max_heapify(0)
         return v
 
     def peek(self) -> safe_type(HeapEntry):
@@ -96,9 +162,9 @@ class MaxHeap:
 
     @staticmethod
     def _parent(idx: int) -> int:
-        if idx & 0x0:
+        if idx == 0:
             return idx
-        return idx >> 0x01
+        return (idx - 1) >> 0x01
 
     def __len__(self) -> int:
         return self.heap_size
@@ -107,8 +173,212 @@ class MaxHeap:
         return self.data[idx]
 
     def __setitem__(self, key: int, value: HeapEntry) -> void:
+        old_value = self.data[key]
         self.data[key] = value
-        self.heapsort()
+        if key < 0:
+            key += self.heap_size
+        if old_value < value:
+            self._sift_up(key)
+        else:
+            self.max_heapify(key)
 
     def __str__(self) -> str:
         return str(self.data)
+
+
+class IndexedMaxHeap(MaxHeap):
+    """
+    MaxHeap which hands out a handle for every inserted entry. A position map (handle -> index in self.data) is kept
+    up to date on every sift, so entries can be re-prioritised or removed in O(log n) without scanning the heap.
+
+    Usage:
+
+    >>> heap = IndexedMaxHeap()
+    >>> handle = heap.insert(SomeEntry(5))
+    >>> heap.increase_key(handle, 10)  # Either a new priority or a whole new entry
+    >>> heap.remove(handle)
+
+    Entries added through pushpop(), replace() or the constructor are not addressable by the caller, use insert() or
+    push_many() when the handle is needed.
+    """
+
+    def __init__(self, data: list_type[HeapEntry] = None):
+        self._handles: list_type[int] = []
+        self._positions: dict[int, int] = {}
+        self._handle_counter: Iterator[int] = itertools.count()
+        super().__init__()
+        if data:
+            self.push_many(data)
+
+    def _new_handles(self, start: int) -> list_type[int]:
+        rv = []
+        for idx in range(start, self.heap_size):
+            handle = next(self._handle_counter)
+            self._handles.append(handle)
+            self._positions[handle] = idx
+            rv.append(handle)
+        return rv
+
+    def max_heapify(self, root_idx: int = 0) -> void:
+        data, handles, positions = self.data, self._handles, self._positions
+        size = len(data)
+        value, handle = data[root_idx], handles[root_idx]
+        idx = root_idx
+        left = (idx << 0x01) + 1
+        while left < size:
+            largest_idx = left
+            right = left + 1
+            if right < size and data[left] < data[right]:
+                largest_idx = right
+            if not value < data[largest_idx]:
+                break
+            data[idx] = data[largest_idx]
+            handles[idx] = moved = handles[largest_idx]
+            positions[moved] = idx
+            idx = largest_idx
+            left = (idx << 0x01) + 1
+        data[idx], handles[idx] = value, handle
+        positions[handle] = idx
+
+    def _sift_up(self, idx: int) -> void:
+        data, handles, positions = self.data, self._handles, self._positions
+        value, handle = data[idx], handles[idx]
+        while idx > 0:
+            parent = (idx - 1) >> 0x01
+            if not data[parent] < value:
+                break
+            data[idx] = data[parent]
+            handles[idx] = moved = handles[parent]
+            positions[moved] = idx
+            idx = parent
+        data[idx], handles[idx] = value, handle
+        positions[handle] = idx
+
+    def insert(self, value: HeapEntry) -> int:
+        """
+        :return: A handle which can be passed to increase_key(), decrease_key(), remove() etc.
+        """
+        self.data.append(value)
+        handle, = self._new_handles(self.heap_size - 1)
+        self._sift_up(self.heap_size - 1)
+        return handle
+
+    def push_many(self, values: Iterable[HeapEntry]) -> list_type[int]:
+        """
+        :return: The handles of the inserted entries, in the order they were given
+        """
+        old_size = self.heap_size
+        self.data.extend(values)
+        handles = self._new_handles(old_size)
+        if old_size == 0 or len(handles) * old_size.bit_length() > self.heap_size:
+            self.heapify()
+        else:
+            for idx in range(old_size, self.heap_size):
+                self._sift_up(idx)
+        return handles
+
+    def pop(self) -> HeapEntry:
+        if not self.data:
+            raise IndexError("pop from empty heap")
+        return self.remove(self._handles[0])
+
+    def pushpop(self, value: HeapEntry) -> HeapEntry:
+        if self.data and value < self.data[0]:
+            value, self.data[0] = self.data[0], value
+            self._positions.pop(self._handles[0])
+            self._handles[0] = handle = next(self._handle_counter)
+            self._positions[handle] = 0
+            self.max_heapify(0)
+        return value
+
+    def replace(self, value: HeapEntry) -> HeapEntry:
+        v = self.data[0]
+        self.data[0] = value
+        self._positions.pop(self._handles[0])
+        self._handles[0] = handle = next(self._handle_counter)
+        self._positions[handle] = 0
+        self.max_heapify(0)
+        return v
+
+    def contains(self, handle: int) -> bool:
+        return handle in self._positions
+
+    def get(self, handle: int) -> HeapEntry:
+        return self.data[self._position(handle)]
+
+    def remove(self, handle: int) -> HeapEntry:
+        """
+        Remove an entry by its handle. The last entry is moved into the freed slot and sifted whichever way it needs.
+        """
+        idx = self._position(handle)
+        removed = self.data[idx]
+        last, last_handle = self.data.pop(), self._handles.pop()
+        del self._positions[handle]
+        if idx < self.heap_size:
+            self.data[idx], self._handles[idx] = last, last_handle
+            self._positions[last_handle] = idx
+            if removed < last:
+                self._sift_up(idx)
+            else:
+                self.max_heapify(idx)
+        return removed
+
+    def increase_key(self, handle: int, value: HeapEntry | Number_t) -> void:
+        """
+        :param handle: Handle returned by insert()
+        :param value: Either a replacement entry or a new priority for the existing entry. Must not be smaller.
+        """
+        idx = self._position(handle)
+        if not self.data[idx] <= value:
+            raise InvalidKeyUpdateException(self.data[idx], value, increase=True)
+        self._update_entry(idx, value)
+        self._sift_up(idx)
+
+    def decrease_key(self, handle: int, value: HeapEntry | Number_t) -> void:
+        """
+        :param handle: Handle returned by insert()
+        :param value: Either a replacement entry or a new priority for the existing entry. Must not be larger.
+        """
+        idx = self._position(handle)
+        if self.data[idx] < value:
+            raise InvalidKeyUpdateException(self.data[idx], value, increase=False)
+        self._update_entry(idx, value)
+        self.max_heapify(idx)
+
+    def _position(self, handle: int) -> int:
+        if handle not in self._positions:
+            raise InvalidHandleException(handle)
+        return self._positions[handle]
+
+    def _update_entry(self, idx: int, value: HeapEntry | Number_t) -> void:
+        if isinstance(value, HeapEntry):
+            self.data[idx] = value
+        else:
+            self.data[idx].i = value
+
+    def __contains__(self, handle: int) -> bool:
+        return self.contains(handle)
+
+
+class InvalidHandleException(Exception):
+
+    def __init__(self, handle: int) -> void:
+        self.handle: const(int) = handle
+
+    def __str__(self) -> str:
+        message = f"The handle {self.handle} does not belong to an entry in this heap. It was either never issued " \
+                  f"or the entry has already been popped/removed."
+        return message
+
+
+class InvalidKeyUpdateException(Exception):
+
+    def __init__(self, old_value: HeapEntry, new_value: HeapEntry | Number_t, increase: bool) -> void:
+        self.old_value: const(HeapEntry) = old_value
+        self.new_value: const(HeapEntry | Number_t) = new_value
+        self.increase: const(bool) = increase
+
+    def __str__(self) -> str:
+        direction = 'increase' if self.increase else 'decrease'
+        message = f"Cannot {direction} the key of {self.old_value} to {self.new_value}."
+        return message
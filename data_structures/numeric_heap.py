@@ -0,0 +1,173 @@
+from array import array
+from typing import Any, Iterable
+
+from types_extensions import void, const, Number_t, safe_type, tuple_type
+
+
+class NumericMaxHeap:
+    """
+    Compact max heap for plain numeric priorities. Priorities live in an `array` (8 bytes each for 'd' or 'q') and
+    payloads in a parallel list, or in a second array when they are integer ids. Sifting compares raw numbers, so
+    there is no per-entry object and no HeapEntry comparison overhead. Use MaxHeap if you need rich entries.
+
+    Usage:
+
+    >>> heap = NumericMaxHeap(typecode='q', payload_typecode='q')  # (priority, id) pairs, 16 bytes each
+    >>> heap.insert(10, 1234)
+    >>> heap.insert(20, 5678)
+    >>> heap.pop()
+    (20, 5678)
+    """
+
+    def __init__(self, typecode: str = 'd', payload_typecode: str = None,
+                 data: Iterable[tuple_type[Number_t, Any]] = None) -> void:
+        """
+        :param typecode: array typecode of the priorities, usually 'd' (float) or 'q' (signed 64-bit int)
+        :param payload_typecode: array typecode of the payloads if they are numeric ids. Leave blank to store any
+        python object in a list instead.
+        :param data: Optional unsorted (priority, payload) pairs to build the heap from
+        """
+        self.typecode: const(str) = typecode
+        self.payload_typecode: const(safe_type(str)) = payload_typecode
+        self.priorities: array = array(typecode)
+        self.payloads: array | list = array(payload_typecode) if payload_typecode else []
+        if data is not None:
+            self.push_many(data)
+
+    @property
+    def heap_size(self) -> int:
+        return len(self.priorities)
+
+    def heapify(self) -> void:
+        for i in range(self.heap_size // 2 - 1, -1, -1):
+            self._sift_down(i)
+
+    def _sift_down(self, idx: int) -> void:
+        priorities, payloads = self.priorities, self.payloads
+        size = len(priorities)
+        priority, payload = priorities[idx], payloads[idx]
+        child = (idx << 0x01) + 1
+        while child < size:
+            child_priority = priorities[child]
+            right = child + 1
+            if right < size and child_priority < priorities[right]:
+                child = right
+                child_priority = priorities[right]
+            if not priority < child_priority:
+                break
+            priorities[idx] = child_priority
+            payloads[idx] = payloads[child]
+            idx = child
+            child = (idx << 0x01) + 1
+        priorities[idx] = priority
+        payloads[idx] = payload
+
+    def _sift_up(self, idx: int) -> void:
+        priorities, payloads = self.priorities, self.payloads
+        priority, payload = priorities[idx], payloads[idx]
+        while idx > 0:
+            parent = (idx - 1) >> 0x01
+            parent_priority = priorities[parent]
+            if not parent_priority < priority:
+                break
+            priorities[idx] = parent_priority
+            payloads[idx] = payloads[parent]
+            idx = parent
+        priorities[idx] = priority
+        payloads[idx] = payload
+
+    def _payload(self, payload: Any) -> Any:
+        return payload if payload is not None or not self.payload_typecode else 0
+
+    def _append(self, priority: Number_t, payload: Any) -> void:
+        # Either both arrays grow or neither does, whichever of the values they reject
+        self.payloads.append(self._payload(payload))
+        try:
+            self.priorities.append(priority)
+        except BaseException:
+            self.payloads.pop()
+            raise
+
+    def _set_top(self, priority: Number_t, payload: Any) -> void:
+        payloads = self.payloads
+        old_payload = payloads[0]
+        payloads[0] = self._payload(payload)
+        try:
+            self.priorities[0] = priority
+        except BaseException:
+            payloads[0] = old_payload
+            raise
+
+    def insert(self, priority: Number_t, payload: Any = None) -> void:
+        """
+        :param priority: Must fit the heap's typecode
+        :param payload: Defaults to 0 when payloads are stored in an array
+        """
+        self._append(priority, payload)
+        self._sift_up(self.heap_size - 1)
+
+    def push_many(self, pairs: Iterable[tuple_type[Number_t, Any]]) -> void:
+        """
+        Insert several (priority, payload) pairs. Large batches are appended and heapified in one O(n) pass.
+        If a pair is rejected, the pairs before it are kept and the heap stays valid.
+        """
+        old_size = self.heap_size
+        try:
+            for priority, payload in pairs:
+                self._append(priority, payload)
+        finally:
+            added = self.heap_size - old_size
+            if old_size == 0 or added * old_size.bit_length() > self.heap_size:
+                self.heapify()
+            else:
+                for idx in range(old_size, self.heap_size):
+                    self._sift_up(idx)
+
+    def pop(self) -> tuple_type[Number_t, Any]:
+        """
+        :return: The (priority, payload) pair with the largest priority
+        """
+        last_priority, last_payload = self.priorities.pop(), self.payloads.pop()
+        if not self.priorities:
+            return last_priority, last_payload
+        rv = self.priorities[0], self.payloads[0]
+        self.priorities[0], self.payloads[0] = last_priority, last_payload
+        self._sift_down(0)
+        return rv
+
+    def pushpop(self, priority: Number_t, payload: Any = None) -> tuple_type[Number_t, Any]:
+        """
+        Insert a pair and pop the largest one. Faster than insert() followed by pop().
+        """
+        if self.priorities and priority < self.priorities[0]:
+            rv = self.priorities[0], self.payloads[0]
+            self._set_top(priority, payload)
+            self._sift_down(0)
+            return rv
+        return priority, self._payload(payload)
+
+    def replace(self, priority: Number_t, payload: Any = None) -> tuple_type[Number_t, Any]:
+        """
+        Pop the largest pair and insert a new one. Faster than pop() followed by insert().
+        """
+        rv = self.priorities[0], self.payloads[0]
+        self._set_top(priority, payload)
+        self._sift_down(0)
+        return rv
+
+    def peek(self) -> safe_type(tuple_type[Number_t, Any]):
+        if self.heap_size > 0:
+            return self.priorities[0], self.payloads[0]
+        return
+
+    def __len__(self) -> int:
+        return self.heap_size
+
+    def __getitem__(self, idx: int) -> tuple_type[Number_t, Any]:
+        return self.priorities[idx], self.payloads[idx]
+
+    def __str__(self) -> str:
+        return f"NumericMaxHeap(<{self.typecode}>, size={self.heap_size}, top={self.peek()})"
+
+    def __repr__(self) -> str:
+        return str(self)
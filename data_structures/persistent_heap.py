@@ -0,0 +1,329 @@
+import mmap
+import os
+import pickle
+import struct
+from typing import Iterable
+
+from data_structures.maxheap import HeapEntry
+from data_structures.numeric_heap import NumericMaxHeap
+from io_extensions.file_rw import safe_make_dirs
+from types_extensions import void, const, safe_type, list_type, tuple_type
+
+_SNAPSHOT_MAGIC: const(bytes) = b'PMAXHEAP'
+_SNAPSHOT_HEADER: const(struct.Struct) = struct.Struct('<8sQ')  # magic, generation
+_SNAPSHOT_RECORD: const(struct.Struct) = struct.Struct('<dI')  # priority, payload length
+_PUSH_RECORD: const(struct.Struct) = struct.Struct('<BdI')  # op, priority, payload length
+_POP_RECORD: const(struct.Struct) = struct.Struct('<BQ')  # op, locator of the popped entry
+_OP_PUSH: const(int) = 1
+_OP_POP: const(int) = 2
+
+
+class PersistentMaxHeap:
+    """
+    A max heap which survives restarts and whose entries don't have to fit in memory.
+
+    Entries are pickled into an append-only log. Pops append a small tombstone record. Once dead records outnumber
+    live ones, the live entries are compacted into a snapshot file (memory-mapped for reads) and a fresh log is
+    started. On startup the snapshot is loaded and the log is replayed on top of it. A torn record at the end of the
+    log (crash mid-write) is discarded.
+
+    Only a compact index of (priority, locator) pairs is kept in memory (see NumericMaxHeap), plus a bounded hot set
+    of the most recently pushed or peeked entries (least recently used ones are evicted). Everything else is read back
+    from disk when it is peeked or popped.
+    Priorities (HeapEntry.i) must be real numbers since they are stored as doubles.
+
+    The interface mirrors MaxHeap's, except for positional access which makes no sense here.
+
+    Usage:
+
+    >>> with PersistentMaxHeap('/var/lib/scheduler/queue') as heap:
+    >>>     heap.insert(SomeEntry(10))
+    >>>     job = heap.pop()
+    """
+
+    def __init__(self, path: str, hot_size: int = 10000, fsync: bool = False, compact_min_records: int = 10000,
+                 data: list_type[HeapEntry] = None) -> void:
+        """
+        :param path: Directory holding the snapshot and log files. Created if missing.
+        :param hot_size: Maximum number of deserialized entries kept in memory (0 disables the hot set)
+        :param fsync: fsync the log after every write. Without it, writes survive a process crash but not necessarily
+        a power loss.
+        :param compact_min_records: Never compact while there are fewer dead records than this
+        :param data: Optional entries to push on top of whatever is already stored
+        """
+        self.path: const(str) = path
+        self.hot_size: int = hot_size
+        self.fsync: bool = fsync
+        self.compact_min_records: int = compact_min_records
+        self._index: NumericMaxHeap = NumericMaxHeap(typecode='d', payload_typecode='q')
+        # Insertion-ordered, least recently used first
+        self._hot: dict[int, HeapEntry] = {}
+        self._dead_records: int = 0
+        self._generation: int = 0
+        self._snapshot_h = None
+        self._snapshot_map: safe_type(mmap.mmap) = None
+        self._log_h = None
+        self._log_reader_h = None
+        safe_make_dirs(self._snapshot_path)
+        self._recover()
+        if data:
+            self.push_many(data)
+
+    @property
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.path, 'snapshot')
+
+    @property
+    def _tmp_snapshot_path(self) -> str:
+        return f'{self._snapshot_path}.tmp'
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.path, f'log.{generation}')
+
+    @property
+    def heap_size(self) -> int:
+        return len(self._index)
+
+    # Recovery
+
+    def _recover(self) -> void:
+        if not os.path.exists(self._snapshot_path):
+            self._write_snapshot(self._snapshot_path, 0, [])
+        self._open_snapshot()
+        live: dict[int, float] = {}
+        for priority, offset, _ in self._iter_snapshot_records():
+            live[offset << 1] = priority
+        self._replay_log(live)
+        for name in os.listdir(self.path):
+            if (name.startswith('log.') and name != os.path.basename(self._log_path(self._generation))) \
+                    or name == os.path.basename(self._tmp_snapshot_path):
+                # Leftovers of a compaction which crashed before cleaning up after itself
+                os.remove(os.path.join(self.path, name))
+        self._index.push_many((priority, locator) for locator, priority in live.items())
+
+    def _open_snapshot(self) -> void:
+        self._snapshot_h = open(self._snapshot_path, 'rb')
+        self._snapshot_map = mmap.mmap(self._snapshot_h.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._generation = _SNAPSHOT_HEADER.unpack_from(self._snapshot_map, 0)
+        if magic != _SNAPSHOT_MAGIC:
+            raise CorruptedHeapFileException(self._snapshot_path)
+
+    def _iter_snapshot_records(self) -> Iterable[tuple_type[float, int, int]]:
+        offset = _SNAPSHOT_HEADER.size
+        size = len(self._snapshot_map)
+        while offset < size:
+            priority, length = _SNAPSHOT_RECORD.unpack_from(self._snapshot_map, offset)
+            yield priority, offset, length
+            offset += _SNAPSHOT_RECORD.size + length
+
+    def _replay_log(self, live: dict[int, float]) -> void:
+        log_path = self._log_path(self._generation)
+        valid_until = 0
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as file_h:
+                contents = file_h.read()
+            offset, size = 0, len(contents)
+            while offset < size:
+                op = contents[offset]
+                if op == _OP_PUSH and offset + _PUSH_RECORD.size <= size:
+                    _, priority, length = _PUSH_RECORD.unpack_from(contents, offset)
+                    if offset + _PUSH_RECORD.size + length > size:
+                        break
+                    live[(offset << 1) | 1] = priority
+                    offset += _PUSH_RECORD.size + length
+                elif op == _OP_POP and offset + _POP_RECORD.size <= size:
+                    _, locator = _POP_RECORD.unpack_from(contents, offset)
+                    live.pop(locator, None)
+                    self._dead_records += 2
+                    offset += _POP_RECORD.size
+                else:
+                    break
+                valid_until = offset
+        self._log_h = open(log_path, 'ab')
+        self._log_h.truncate(valid_until)
+        self._log_h.seek(0, os.SEEK_END)
+        self._log_reader_h = open(log_path, 'rb')
+
+    # Storage
+
+    def _append(self, record: bytes) -> int:
+        offset = self._log_h.tell()
+        self._log_h.write(record)
+        return offset
+
+    def _flush(self) -> void:
+        self._log_h.flush()
+        if self.fsync:
+            os.fsync(self._log_h.fileno())
+
+    def _append_push(self, entry: HeapEntry) -> int:
+        payload = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        offset = self._append(_PUSH_RECORD.pack(_OP_PUSH, entry.i, len(payload)) + payload)
+        locator = (offset << 1) | 1
+        self._index.insert(entry.i, locator)
+        self._cache(locator, entry)
+        return locator
+
+    def _cache(self, locator: int, entry: HeapEntry) -> void:
+        if self.hot_size <= 0:
+            return
+        self._hot.pop(locator, None)
+        self._hot[locator] = entry
+        while len(self._hot) > self.hot_size:
+            del self._hot[next(iter(self._hot))]
+
+    def _load(self, locator: int) -> HeapEntry:
+        if (entry := self._hot.get(locator)) is not None:
+            return entry
+        return pickle.loads(self._raw_payload(locator))
+
+    def _take(self, locator: int) -> HeapEntry:
+        entry = self._load(locator)
+        self._hot.pop(locator, None)
+        self._append(_POP_RECORD.pack(_OP_POP, locator))
+        self._dead_records += 2
+        return entry
+
+    @staticmethod
+    def _write_snapshot(path: str, generation: int, payloads: Iterable[tuple_type[float, bytes]]) -> void:
+        with open(path, 'wb') as file_h:
+            file_h.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, generation))
+            for priority, payload in payloads:
+                file_h.write(_SNAPSHOT_RECORD.pack(priority, len(payload)))
+                file_h.write(payload)
+            file_h.flush()
+            os.fsync(file_h.fileno())
+
+    def _maybe_compact(self) -> void:
+        if self._dead_records >= max(self.compact_min_records, self.heap_size):
+            self.compact()
+
+    def compact(self) -> void:
+        """
+        Rewrite all live entries into a new snapshot and start an empty log.
+        The new snapshot only replaces the old one once fully written, so a crash at any point leaves a consistent
+        snapshot + log pair behind.
+        """
+        self._log_h.flush()
+        new_generation = self._generation + 1
+        tmp_path = self._tmp_snapshot_path
+        live = [self._index[idx] for idx in range(self.heap_size)]
+        self._write_snapshot(tmp_path, new_generation, ((priority, self._raw_payload(locator))
+                                                        for priority, locator in live))
+        self._close_files()
+        os.replace(tmp_path, self._snapshot_path)
+        # The rename must be durable before the old log goes, or a power loss could keep the deletion but not the
+        # rename and leave the old snapshot without its log
+        self._fsync_dir()
+        old_log_path = self._log_path(self._generation)
+        self._open_snapshot()
+        new_locators = {}
+        for (_, old_locator), (_, offset, _) in zip(live, self._iter_snapshot_records()):
+            new_locators[old_locator] = offset << 1
+        for idx in range(self.heap_size):
+            self._index.payloads[idx] = new_locators[self._index.payloads[idx]]
+        self._hot = {new_locators[locator]: entry for locator, entry in self._hot.items()}
+        self._dead_records = 0
+        self._log_h = open(self._log_path(self._generation), 'ab')
+        self._log_reader_h = open(self._log_path(self._generation), 'rb')
+        os.remove(old_log_path)
+
+    def _fsync_dir(self) -> void:
+        dir_fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _raw_payload(self, locator: int) -> bytes:
+        offset = locator >> 1
+        if locator & 1:
+            self._log_h.flush()
+            self._log_reader_h.seek(offset)
+            _, _, length = _PUSH_RECORD.unpack(self._log_reader_h.read(_PUSH_RECORD.size))
+            return self._log_reader_h.read(length)
+        _, length = _SNAPSHOT_RECORD.unpack_from(self._snapshot_map, offset)
+        start = offset + _SNAPSHOT_RECORD.size
+        return self._snapshot_map[start:start + length]
+
+    # MaxHeap interface
+
+    def insert(self, value: HeapEntry) -> void:
+        self._append_push(value)
+        self._flush()
+
+    def push_many(self, values: Iterable[HeapEntry]) -> void:
+        """
+        Same as insert() for every value, with a single flush at the end.
+        """
+        for value in values:
+            self._append_push(value)
+        self._flush()
+
+    def pop(self) -> HeapEntry:
+        _, locator = self._index.pop()
+        entry = self._take(locator)
+        self._flush()
+        self._maybe_compact()
+        return entry
+
+    def pushpop(self, value: HeapEntry) -> HeapEntry:
+        if self.heap_size == 0 or not value < self._index.peek()[0]:
+            return value
+        self.insert(value)
+        return self.pop()
+
+    def replace(self, value: HeapEntry) -> HeapEntry:
+        if self.heap_size == 0:
+            raise IndexError("replace on empty heap")
+        entry = self.pop()
+        self.insert(value)
+        return entry
+
+    def peek(self) -> safe_type(HeapEntry):
+        if self.heap_size > 0:
+            locator = self._index.peek()[1]
+            entry = self._load(locator)
+            self._cache(locator, entry)
+            return entry
+        return
+
+    def _close_files(self) -> void:
+        for file_h in (self._log_h, self._log_reader_h):
+            if file_h is not None:
+                file_h.close()
+        if self._snapshot_map is not None:
+            self._snapshot_map.close()
+        if self._snapshot_h is not None:
+            self._snapshot_h.close()
+        self._log_h = self._log_reader_h = self._snapshot_map = self._snapshot_h = None
+
+    def close(self) -> void:
+        if self._log_h is not None:
+            self._flush()
+        self._close_files()
+
+    def __enter__(self) -> 'PersistentMaxHeap':
+        return self
+
+    def __exit__(self, *a, **k) -> void:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.heap_size
+
+    def __str__(self) -> str:
+        return f"PersistentMaxHeap(<{self.path}>, size={self.heap_size}, hot={len(self._hot)})"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+class CorruptedHeapFileException(Exception):
+
+    def __init__(self, path: str) -> void:
+        self.file_path: const(str) = path
+
+    def __str__(self) -> str:
+        message = f"The file {self.file_path} is not a PersistentMaxHeap snapshot or is corrupted."
+        return message
@@ -1,7 +1,17 @@
-import functools
-from typing import Iterable, Any
+import bisect
+import gc
+import itertools
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Iterable, Iterator, Any, NamedTuple
 
-from types_extensions import void, const, _assert_py_version, PythonVersion, list_type
+from data_structures.heap_utils import nsmallest
+from io_extensions.file_rw import safe_fwrite
+from types_extensions import void, const, safe_type, _assert_py_version, PythonVersion, list_type, tuple_type, Number_t
 
 _assert_py_version(PythonVersion(3, 10))
 
@@ -11,14 +21,16 @@ class _TrieNode:
     Do not use this class directly.
     self.complete = Does this Node correspond to a word?
     self.size = Number of all completed words downstream. Size should never be 0.
-    TODO: Weighed nodes/weighed trie
+
+    Nodes don't validate characters, the Trie checks every word against its charsets once before it reaches the nodes.
+    Children can be reached either through self.children or as attributes (see __getattr__).
     """
 
-    default_charset = r'abcdefghijklmnopqrstuvwxyz!@#$%^&*()-_1234567890=+[{]}\|;:\'"<,>./?`~'
+    __slots__ = ('character', 'children', 'size', 'complete')
 
-    def __init__(self, character: str, charset: str | Iterable[str]) -> void:
+    default_charset = r'abcdefghijklmnopqrstuvwxyz!@#$%^&*()-_1234567890=+[{]}\|;:\'"<,>./?`~'
 
-        self.charset: set[str] = iterable_to_set(charset or self.default_charset)
+    def __init__(self, character: str) -> void:
         self.character: const(str) = character
         self.children: dict[str, _TrieNode] = {}
         self.size: int = 0
@@ -28,64 +40,120 @@ class _TrieNode:
     def is_leaf(self) -> bool:
         return len(self.children) == 0
 
-    def insert(self, partial: str) -> void:
-        first_letter = partial[0]
-        if first_letter not in self.charset:
-            raise InvalidCharacterException(first_letter, self.charset)
-        if first_letter not in self.children:
-            node = _TrieNode(character=first_letter, charset=self.charset)
-            self.children[first_letter] = node
-            setattr(self, first_letter, node)
-        else:
-            node = self.children[first_letter]
-        match len(partial):
-            case x if x > 1:
-                new_partial = partial[1:]
-                node.insert(partial=new_partial)
-            case x if x == 1:
-                node._set_complete()
-        self.size += 1
-
-    def _set_complete(self) -> void:
-        if not self.complete:
-            self.size += 1
-            self.complete = True
-
-    def _invalidate(self) -> void:
-        if self.complete:
-            self.size -= 1
-            self.complete = False
+    def insert(self, word: str, index: int) -> bool:
+        """
+        Insert word[index:] below this node.
 
-    def search(self, word: str, index: int) -> list_type[str]:
-        rv = []
-        if len(word) <= index + 1:
-            if self.complete:
-                rv.append(word)
-            for node in self.children.values():
-                rv.extend(node.search(word + node.character, index + 1))
-        else:
-            if (next_letter := word[index + 1]) in self.children:
-                rv.extend(self.children[next_letter].search(word, index + 1))
+        :return: True if the word wasn't already complete
+        """
+        path = [self]
+        node = self
+        for i in range(index, len(word)):
+            char_ = word[i]
+            child = node.children.get(char_)
+            if child is None:
+                child = node.children[char_] = type(self)(character=char_)
+            node = child
+            path.append(node)
+        if node.complete:
+            return False
+        node.complete = True
+        for node in path:
+            node.size += 1
+        return True
 
-        return rv
+    def _walk(self, word: str, index: int) -> safe_type(list_type['_TrieNode']):
+        path = [self]
+        node = self
+        for i in range(index, len(word)):
+            node = node.children.get(word[i])
+            if node is None:
+                return
+            path.append(node)
+        return path
 
-    def delete(self, partial: str, delete_downstream: bool) -> bool:
-        if len(partial) == 0:
-            if self.complete:
-                if not self.is_leaf:
-                    self._invalidate()
-                return True
+    def find(self, word: str, index: int) -> safe_type('_TrieNode'):
+        """
+        :return: The node reached by following word[index:] from this node, if any
+        """
+        node = self
+        for i in range(index, len(word)):
+            node = node.children.get(word[i])
+            if node is None:
+                return
+        return node
+
+    def iter_collect(self, prefix: str, lexicographic: bool = False) -> Iterator[str]:
+        """
+        Lazily yield all complete words in this subtree, depth-first with children in insertion order (or sorted if
+        lexicographic is set). Nothing beyond what the caller consumes is visited.
+        The current word is kept as a list of edge labels and only joined for complete nodes.
+
+        :param prefix: The word this node corresponds to
+        :param lexicographic: Yield the words in alphabetical order
+        """
+        parts = []
+        stack = [(self, prefix, 0)]
+        while stack:
+            node, label, depth = stack.pop()
+            del parts[depth:]
+            parts.append(label)
+            if node.complete:
+                yield ''.join(parts)
+            children = node.children
+            if lexicographic:
+                for key in sorted(children, reverse=True):
+                    stack.append((children[key], children[key].character, depth + 1))
+            else:
+                for child in reversed(children.values()):
+                    stack.append((child, child.character, depth + 1))
+
+    def find_prefix(self, word: str, index: int) -> safe_type(tuple_type['_TrieNode', str]):
+        """
+        :return: The node reached by following word[index:] from this node and the word it corresponds to, if any
+        """
+        node = self.find(word, index)
+        if node is None:
+            return
+        return node, word
+
+    def delete(self, word: str, index: int, delete_downstream: bool) -> bool:
+        """
+        Delete word[index:] below this node. Branches which no longer lead to a complete word are pruned, but this node
+        is never removed by itself. The caller is responsible for that.
+
+        :return: True if the word existed and was deleted
+        """
+        path = self._walk(word, index)
+        if path is None or not path[-1].complete:
             return False
-        first_letter = partial[0]
-        if first_letter in self.children:
-            node = self.children[first_letter]
-            downstream_result = node.delete(partial=partial[1:], delete_downstream=delete_downstream)
-            if downstream_result:
-                if node.is_leaf or delete_downstream:
-                    del self.children[first_letter]
-                self.size -= 1
-            return downstream_result
-        return False
+        self._delete_path(path, delete_downstream)
+        return True
+
+    @staticmethod
+    def _delete_path(path: list_type['_TrieNode'], delete_downstream: bool) -> void:
+        target = path[-1]
+        if delete_downstream:
+            removed = target.size
+            target.complete = False
+            target.children = {}
+        else:
+            removed = 1
+            target.complete = False
+        for node in path:
+            node.size -= removed
+        for i in range(len(path) - 1, 0, -1):
+            node = path[i]
+            if node.size > 0:
+                break
+            del path[i - 1].children[node.character[0]]
+
+    def __getattr__(self, item: str) -> '_TrieNode':
+        # Only reached when regular attribute lookup fails, so a child character is the only thing left to try
+        try:
+            return object.__getattribute__(self, 'children')[item]
+        except (KeyError, AttributeError):
+            raise AttributeError(item) from None
 
     def __str__(self) -> str:
         return f"TrieNode(<{self.character}>, complete={self.complete}, is_leaf={self.is_leaf})"
@@ -94,6 +162,225 @@ class _TrieNode:
         return str(self)
 
 
+class _RadixNode(_TrieNode):
+    """
+    Do not use this class directly.
+    Node of a compressed (radix/Patricia) trie. self.character holds the whole substring on the edge leading to this
+    node rather than a single character, and children are still keyed by the first character of their edge.
+    Every node is either complete or has at least two children, except for the root.
+    """
+
+    __slots__ = ()
+
+    def insert(self, word: str, index: int) -> bool:
+        path = [self]
+        node = self
+        i = index
+        while i < len(word):
+            child = node.children.get(word[i])
+            if child is None:
+                child = node.children[word[i]] = _RadixNode(character=word[i:])
+                path.append(child)
+                node = child
+                break
+            label = child.character
+            common = _common_prefix_length(label, word, i)
+            if common < len(label):
+                # The word leaves the edge half-way, so the edge is split in two at that point
+                middle = _RadixNode(character=label[:common])
+                middle.size = child.size
+                child.character = label[common:]
+                middle.children[child.character[0]] = child
+                node.children[word[i]] = middle
+                child = middle
+            path.append(child)
+            node = child
+            i += common
+        if node.complete:
+            return False
+        node.complete = True
+        for node in path:
+            node.size += 1
+        return True
+
+    def _walk(self, word: str, index: int) -> safe_type(list_type['_RadixNode']):
+        path = [self]
+        node = self
+        i = index
+        while i < len(word):
+            node = node.children.get(word[i])
+            if node is None or not word.startswith(node.character, i):
+                return
+            path.append(node)
+            i += len(node.character)
+        return path
+
+    def find(self, word: str, index: int) -> safe_type('_RadixNode'):
+        path = self._walk(word, index)
+        if path is None:
+            return
+        return path[-1]
+
+    def find_prefix(self, word: str, index: int) -> safe_type(tuple_type['_RadixNode', str]):
+        node = self
+        i = index
+        while i < len(word):
+            node = node.children.get(word[i])
+            if node is None:
+                return
+            label = node.character
+            common = _common_prefix_length(label, word, i)
+            if i + common == len(word):
+                # The prefix ends on (or half-way down) this edge, the rest of the edge belongs to every completion
+                return node, word + label[common:]
+            if common < len(label):
+                return
+            i += common
+        return node, word
+
+    def delete(self, word: str, index: int, delete_downstream: bool) -> bool:
+        path = self._walk(word, index)
+        if path is None or not path[-1].complete:
+            return False
+        self._delete_path(path, delete_downstream)
+        # Pruning can leave the deepest surviving node on the path with a single child and no word of its own
+        for node in reversed(path[1:]):
+            if node.size > 0:
+                if not node.complete and len(node.children) == 1:
+                    child, = node.children.values()
+                    node.character += child.character
+                    node.children = child.children
+                    node.complete = child.complete
+                break
+        return True
+
+
+class _WeightedTrieNode(_TrieNode):
+    """
+    Do not use this class directly.
+    self.weight = Weight of the word this node corresponds to (if complete)
+    self.top = The best completions in this subtree as (-weight, word) pairs, sorted. Holds at most the owning
+    WeightedTrie's top_k_size entries, and everything in the subtree if there are fewer words than that.
+    """
+
+    __slots__ = ('weight', 'top')
+
+    def __init__(self, character: str) -> void:
+        super().__init__(character)
+        self.weight: Number_t = 0
+        self.top: list_type[tuple_type[Number_t, str]] = []
+
+    def offer(self, word: str, weight: Number_t, top_k_size: int) -> void:
+        """
+        Add a word to the top list if it makes the cut. The word must not already be in the list.
+        """
+        entry = (-weight, word)
+        if len(self.top) < top_k_size:
+            bisect.insort(self.top, entry)
+        elif entry < self.top[-1]:
+            bisect.insort(self.top, entry)
+            self.top.pop()
+
+    def withdraw(self, word: str) -> bool:
+        """
+        :return: True if the word was in the top list and has been removed
+        """
+        for idx, (_, candidate) in enumerate(self.top):
+            if candidate == word:
+                del self.top[idx]
+                return True
+        return False
+
+    def refresh(self, own_word: str, top_k_size: int) -> void:
+        """
+        Rebuild the top list from the children's lists, which have to be up to date.
+        """
+        candidates = [entry for child in self.children.values() for entry in child.top]
+        if self.complete:
+            candidates.append((-self.weight, own_word))
+        candidates.sort()
+        self.top = candidates[:top_k_size]
+
+
+class SearchCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    invalidations: int
+    size: int
+    max_size: int
+
+
+class _SearchCache:
+    """
+    Do not use this class directly.
+    Per-trie LRU cache of search results keyed by (word, max_results). Keys are also indexed by their word, so a change
+    to the trie only drops the entries whose results it can affect: the prefixes of the changed word (and, for
+    downstream deletes, everything below it) instead of the whole cache.
+    """
+
+    def __init__(self, max_size: int) -> void:
+        self.max_size: int = max_size
+        self._entries: OrderedDict[tuple_type[str, safe_type(int)], list_type[str]] = OrderedDict()
+        self._keys_by_word: dict[str, set[tuple_type[str, safe_type(int)]]] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+
+    def get(self, key: tuple_type[str, safe_type(int)]) -> safe_type(list_type[str]):
+        results = self._entries.get(key)
+        if results is None:
+            self.misses += 1
+            return
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return results
+
+    def put(self, key: tuple_type[str, safe_type(int)], results: list_type[str]) -> void:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = results
+        self._keys_by_word.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            self._unindex(evicted)
+
+    def _unindex(self, key: tuple_type[str, safe_type(int)]) -> void:
+        keys = self._keys_by_word[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_word[key[0]]
+
+    def _drop_word(self, word: str) -> void:
+        for key in self._keys_by_word.pop(word, ()):
+            del self._entries[key]
+            self.invalidations += 1
+
+    def invalidate(self, word: str, downstream: bool = False) -> void:
+        """
+        Drop the cached searches whose results may change when `word` is inserted or deleted.
+
+        :param word: The inserted/deleted word
+        :param downstream: The whole subtree under the word changed, so searches for its extensions are dropped too
+        """
+        if not self._entries:
+            return
+        for i in range(1, len(word) + 1):
+            self._drop_word(word[:i])
+        if downstream:
+            for cached_word in [cached for cached in self._keys_by_word if cached.startswith(word)]:
+                self._drop_word(cached_word)
+
+    def clear(self) -> void:
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._keys_by_word.clear()
+
+    @property
+    def stats(self) -> SearchCacheStats:
+        return SearchCacheStats(hits=self.hits, misses=self.misses, invalidations=self.invalidations,
+                                size=len(self._entries), max_size=self.max_size)
+
+
 class Trie:
     """
     Trie structure which is an unbalanced multi-branch tree of characters which make up words.
@@ -101,18 +388,96 @@ class Trie:
 
     Individual nodes can be reached by either going over each dict one by one or by using properties_and_methods
     Eg: To get the node at the "i" in "hi" in Trie trie_ (assuming you know the h and i nodes exist):
-    >>> i_node = trie_.heads.get('h').get('i')
+    >>> i_node = trie_.heads.get('h').children.get('i')
     >>> i_node = trie_.h.i
 
     """
 
     default_charset = 'abcdefghijklmnopqrstuvwxyz1234567890'
+    _node_type: type = _TrieNode
 
-    def __init__(self, trie_charset: str | Iterable[str] = None, node_charset: str | Iterable[str] = None) -> void:
+    def __init__(self, trie_charset: str | Iterable[str] = None, node_charset: str | Iterable[str] = None,
+                 cache_size: int = 1024) -> void:
+        """
+        :param trie_charset: Characters allowed at the start of a word
+        :param node_charset: Characters allowed anywhere else
+        :param cache_size: Maximum number of search() results cached. 0 disables the cache.
+        """
         self.charset: set[str] = iterable_to_set(trie_charset or self.default_charset)
-        self.heads: dict[str, _TrieNode] = {}
-        self._node_charset: str | Iterable[str] = node_charset
-        self.size: int = 0
+        # The root corresponds to the empty word, its children are the heads
+        self._root: _TrieNode = self._node_type(character='')
+        self._node_charset: set[str] = iterable_to_set(node_charset or _TrieNode.default_charset)
+        self._search_cache: _SearchCache = _SearchCache(cache_size)
+
+    @property
+    def heads(self) -> dict[str, _TrieNode]:
+        return self._root.children
+
+    @property
+    def size(self) -> int:
+        return self._root.size
+
+    @classmethod
+    def from_iterable(cls, words: Iterable[str], presorted: bool = False,
+                      trie_charset: str | Iterable[str] = None, node_charset: str | Iterable[str] = None,
+                      cache_size: int = 1024, pause_gc: bool = False) -> 'Trie':
+        """
+        Build a trie from many words at once, which is much faster than calling insert() for each of them.
+        Sorted input is consumed in a single pass: each word only re-walks the prefix it shares with the previous one
+        and everything after that is appended as new nodes, with no dict lookups for existing children.
+        Subclasses with their own node types fall back to calling insert() for each word.
+
+        :param words: The words to insert. Duplicates are fine.
+        :param presorted: The words are already sorted (after casefolding), so they don't need to be sorted in memory
+        :param pause_gc: Disable the cyclic garbage collector during the build. Millions of new nodes keep triggering
+        it, and it then traverses the whole trie over and over again, which can make large builds several times
+        slower. Note that this pauses it for the whole process (every thread), and that it is re-enabled afterwards
+        if it was enabled when the build started, regardless of what other threads did to it in the meantime.
+        """
+        trie = cls(trie_charset=trie_charset, node_charset=node_charset, cache_size=cache_size)
+        gc_was_enabled = gc.isenabled()
+        if pause_gc:
+            gc.disable()
+        try:
+            if cls._node_type is not _TrieNode:
+                for word in words:
+                    trie.insert(word)
+            else:
+                words = (word.casefold() for word in words)
+                trie._build_sorted(words if presorted else sorted(words))
+        finally:
+            if pause_gc and gc_was_enabled:
+                gc.enable()
+        return trie
+
+    def _build_sorted(self, words: Iterable[str]) -> void:
+        """
+        Insert casefolded words in sorted order into an empty trie. See from_iterable().
+        """
+        root = self._root
+        # path[i] is the node for the first i characters of the previous word
+        path = [root]
+        previous = ''
+        for word in words:
+            if word == previous:
+                continue
+            if len(word) == 0:
+                raise EmptyInputException
+            if word < previous:
+                raise UnsortedInputException(previous, word)
+            self._validate(word)
+            common = _common_prefix_length(previous, word, 0)
+            del path[common + 1:]
+            node = path[-1]
+            for i in range(common, len(word)):
+                # Sorted input means every character past the shared prefix starts a brand new branch
+                child = node.children[word[i]] = _TrieNode(character=word[i])
+                path.append(child)
+                node = child
+            node.complete = True
+            for node in path:
+                node.size += 1
+            previous = word
 
     def __setattr__(self, key: str, value: Any) -> void:
         if len(key) == 1 and key in self.charset and not isinstance(value, _TrieNode):
@@ -120,6 +485,21 @@ class Trie:
             raise ReservedAttributeException(key)
         super().__setattr__(key, value)
 
+    def __getattr__(self, item: str) -> _TrieNode:
+        # Only reached when regular attribute lookup fails, so a head character is the only thing left to try
+        try:
+            return self.__dict__['_root'].children[item]
+        except KeyError:
+            raise AttributeError(item) from None
+
+    def _validate(self, word: str) -> void:
+        if word[0] not in self.charset:
+            raise InvalidCharacterException(word[0], self.charset)
+        rest = word[1:]
+        if not self._node_charset.issuperset(rest):
+            invalid = next(char_ for char_ in rest if char_ not in self._node_charset)
+            raise InvalidCharacterException(invalid, self._node_charset)
+
     def insert(self, word: str) -> void:
         """
         Add a new word to the trie. See _TrieNode.insert() for more details on how each letter floats down.
@@ -131,29 +511,17 @@ class Trie:
             raise EmptyInputException
 
         word = word.casefold()
-        first_letter = word[0]
-        if first_letter not in self.charset:
-            raise InvalidCharacterException(first_letter, self.charset)
-        if first_letter not in self.heads:
-            node = _TrieNode(character=first_letter, charset=self._node_charset)
-            self.heads[first_letter] = node
-            setattr(self, first_letter, node)
-        else:
-            node = self.heads[first_letter]
-        if len(word) > 1:
-            new_partial = word[1:]
-            node.insert(partial=new_partial)
-        self.search.cache_clear()
-        self.size += 1
-
-    @functools.cache
+        self._validate(word)
+        if self._root.insert(word, 0):
+            self._search_cache.invalidate(word)
+
     def search(self, word: str, insert_if_missing: bool = False, max_results: int = None) -> list_type[str]:
         """
         Looks for a word (complete or partly complete). It will return a list of the word (if it exists and is
         complete), as well as ALL downstream results if max_results isn't set. For now, results are ordered in the
         way thay are found.
 
-        Searches are cached in until the insert() or delete() methods are called.
+        Searches are cached in an LRU cache (see cache_size) until an insert() or delete() changes their results.
 
         :param word: The word or word partial to search for
         :param insert_if_missing: If the word is missing, insert it for next time. (Maybe don't do this for partials)
@@ -164,24 +532,84 @@ class Trie:
             raise EmptyInputException
 
         word = word.casefold()
-        first_letter = word[0]
-        if first_letter not in self.heads:
-            if insert_if_missing:
-                self.insert(word)
-                return [word]
-            else:
-                return []
-        results = self.heads[first_letter].search(word, 0)
+        key = (word, max_results or None)
+        results = self._search_cache.get(key)
+        # An empty result means the word is missing, which insert_if_missing has to act upon
+        if results is not None and (results or not insert_if_missing):
+            return list(results)
+        results = list(itertools.islice(self.iter_search(word), max_results or None))
         if len(results) == 0 and insert_if_missing:
+            starts_new_head = word[0] not in self.heads
             self.insert(word)
-        if not max_results or len(results) <= max_results:
-            return results
-        return results[:max_results]
+            # As it always has, a word which didn't even share its first letter with another one is returned
+            return [word] if starts_new_head else results
+        self._search_cache.put(key, results)
+        return list(results)
+
+    def search_fuzzy(self, word: str, max_distance: int = 1, max_results: int = None,
+                     with_distances: bool = False) -> list_type[str | tuple_type[str, int]]:
+        """
+        Typo-tolerant lookup: all words within a Levenshtein (edit) distance of `max_distance` from the given word,
+        closest first and alphabetically within the same distance.
+
+        The trie is walked once while a row of the edit distance matrix is computed per character. Words sharing a
+        prefix share the rows for it, and a branch is abandoned as soon as every value in its row is above
+        max_distance, since descending further can only make the distance larger.
+
+        :param word: The (possibly misspelled) word to look for
+        :param max_distance: Maximum number of insertions, deletions and substitutions
+        :param max_results: Leave blank for all matches
+        :param with_distances: Return (word, distance) pairs instead of just words
+        """
+        if len(word) == 0:
+            raise EmptyInputException
+        word = word.casefold()
+        matches = []
+        stack = [(child, list(range(len(word) + 1)), '') for child in self._root.children.values()]
+        while stack:
+            node, row, prefix = stack.pop()
+            for char_ in node.character:
+                row = _next_levenshtein_row(row, char_, word)
+                if min(row) > max_distance:
+                    break
+            else:
+                current = prefix + node.character
+                if node.complete and row[-1] <= max_distance:
+                    matches.append((row[-1], current))
+                for child in node.children.values():
+                    stack.append((child, row, current))
+        matches = nsmallest(matches, max_results) if max_results else sorted(matches)
+        if with_distances:
+            return [(match, distance) for distance, match in matches]
+        return [match for _, match in matches]
+
+    @property
+    def search_cache_stats(self) -> SearchCacheStats:
+        return self._search_cache.stats
+
+    def clear_search_cache(self) -> void:
+        self._search_cache.clear()
+
+    def iter_search(self, word: str, lexicographic: bool = False) -> Iterator[str]:
+        """
+        Generator version of search(). Completions are produced one at a time as the subtree is walked, so stopping
+        early (e.g. after the first 10 results) never touches the rest of the subtree. Not cached.
+
+        :param word: The word or word partial to search for
+        :param lexicographic: Yield results in alphabetical order instead of the order they are found in
+        """
+        if len(word) == 0:
+            raise EmptyInputException
+        word = word.casefold()
+        found = self._root.find_prefix(word, 0)
+        if found is None:
+            return
+        yield from found[0].iter_collect(found[1], lexicographic=lexicographic)
 
     def delete(self, word: str, delete_downstream: bool = False) -> bool:
         """
         Delete a word from the trie. Can be used to trim entire branches with cascading deletes.
-        Invalidates search cache only upon successful delete.
+        Invalidates the cached searches affected by the word only upon successful delete.
 
         :param word: The word to delete
         :param delete_downstream: Dangerous! Will delete the node, even if it has children!
@@ -191,32 +619,457 @@ class Trie:
             raise EmptyInputException
 
         word = word.casefold()
-        first_letter = word[0]
-        if first_letter not in self.heads:
-            return False
-        new_partial = word[1:]
-        rv = self.heads[first_letter].delete(partial=new_partial, delete_downstream=delete_downstream)
+        rv = self._root.delete(word, 0, delete_downstream=delete_downstream)
         if rv:
-            self.size -= 1
-            self.search.cache_clear()
+            self._search_cache.invalidate(word, downstream=delete_downstream)
         return rv
 
     def exists(self, word: str) -> bool:
         """
         Does a word exist? (Partials not matched)
         """
+        if len(word) == 0:
+            raise EmptyInputException
+        node = self._root.find(word.casefold(), 0)
+        return node is not None and node.complete
+
+    def _walk_many(self, words: Iterable[str]) -> dict[str, safe_type(tuple_type[_TrieNode, str, bool])]:
+        """
+        Look up many words in a single sorted pass. The path of the previous word is kept, so each word only walks
+        the part after the prefix it shares with the previous one.
+
+        :return: For every distinct casefolded word, the node its prefix ends in, the word that node corresponds to
+        and whether the word ends exactly on that node (None if the prefix isn't in the trie)
+        """
+        rv = {}
+        # Entries are (node, length of the word it corresponds to)
+        path = [(self._root, 0)]
+        previous = ''
+        for word in sorted(set(words)):
+            if len(word) == 0:
+                raise EmptyInputException
+            common = _common_prefix_length(previous, word, 0)
+            while path[-1][1] > common:
+                path.pop()
+            previous = word
+            node, i = path[-1]
+            found = None
+            while i < len(word):
+                child = node.children.get(word[i])
+                if child is None:
+                    break
+                label = child.character
+                if word.startswith(label, i):
+                    node, i = child, i + len(label)
+                    path.append((node, i))
+                    continue
+                if label.startswith(word[i:]):
+                    # The word ends half-way down a radix edge
+                    found = child, word + label[len(word) - i:], False
+                break
+            else:
+                found = node, word, True
+            rv[word] = found
+        return rv
+
+    def exists_many(self, words: Iterable[str]) -> list_type[bool]:
+        """
+        exists() for many words at once, sharing the walk over common prefixes. See _walk_many().
+
+        :return: Results in the same order as the given words
+        """
+        words = [word.casefold() for word in words]
+        found = self._walk_many(words)
+        rv = []
+        for word in words:
+            match = found[word]
+            rv.append(match is not None and match[2] and match[0].complete)
+        return rv
+
+    def search_many(self, words: Iterable[str], max_results: int = None) -> list_type[list_type[str]]:
+        """
+        search() for many words/prefixes at once, sharing the walk over common prefixes. See _walk_many().
+        Results are not cached.
+
+        :return: Results in the same order as the given words
+        """
+        words = [word.casefold() for word in words]
+        results = {}
+        for word, match in self._walk_many(words).items():
+            if match is None:
+                results[word] = []
+            else:
+                results[word] = list(itertools.islice(match[0].iter_collect(match[1]), max_results or None))
+        return [results[word] for word in words]
+
+    def freeze(self) -> 'FrozenTrie':
+        """
+        Build an immutable, compact snapshot of the trie which can be saved to a file and memory-mapped by any number
+        of processes. See FrozenTrie.
+        """
+        return FrozenTrie.from_trie(self)
+
+
+class RadixTrie(Trie):
+    """
+    Compressed (radix/Patricia) variant of the Trie. Chains of nodes with a single child and no word of their own are
+    collapsed into one node whose edge holds the whole substring. Edges are split on insert and merged back on delete.
+    This pays off for long keys with unique suffixes (URLs, paths etc.), which would otherwise be one node per
+    character.
+
+    The API is the same as the Trie's, except that attribute access goes by the first character of an edge:
+    >>> trie_ = RadixTrie()
+    >>> trie_.insert('https://example.com')
+    >>> trie_.h
+    TrieNode(<https://example.com>, complete=True, is_leaf=True)
+    """
+
+    _node_type: type = _RadixNode
+
+
+class WeightedTrie(Trie):
+    """
+    Trie where every word has a weight, for autocompletion. Each node keeps its best `top_k_size` completions, updated
+    on every insert/delete along the path of the changed word, so top_k() is a prefix walk plus a slice and never has
+    to visit the rest of the subtree (as long as k <= top_k_size).
+
+    Usage:
+
+    >>> trie_ = WeightedTrie(top_k_size=5)
+    >>> trie_.insert('hello', 10)
+    >>> trie_.insert('help', 50)
+    >>> trie_.insert('helium', 20)
+    >>> trie_.top_k('hel', 2)
+    ['help', 'helium']
+    """
+
+    _node_type: type = _WeightedTrieNode
+
+    def __init__(self, trie_charset: str | Iterable[str] = None, node_charset: str | Iterable[str] = None,
+                 cache_size: int = 1024, top_k_size: int = 10) -> void:
+        super().__init__(trie_charset=trie_charset, node_charset=node_charset, cache_size=cache_size)
+        self.top_k_size: const(int) = top_k_size
+
+    def insert(self, word: str, weight: Number_t = 1) -> void:
+        """
+        Add a new word to the trie or update the weight of an existing one.
+
+        :param word: The word to insert
+        :param weight: Higher weights rank first in top_k()
+        """
+        super().insert(word)
+        word = word.casefold()
+        path = self._root._walk(word, 0)
+        target = path[-1]
+        old_weight, target.weight = target.weight, weight
+        self._update_tops(path, word, weight < old_weight, deleted=False)
+
+    def weight(self, word: str) -> safe_type(Number_t):
+        """
+        :return: The weight of the word, or None if it doesn't exist
+        """
+        node = self._root.find(word.casefold(), 0)
+        if node is None or not node.complete:
+            return
+        return node.weight
+
+    def delete(self, word: str, delete_downstream: bool = False) -> bool:
         if len(word) == 0:
             raise EmptyInputException
         word = word.casefold()
-        first_letter = word[0]
-        if first_letter not in self.heads:
+        path = self._root._walk(word, 0)
+        if not super().delete(word, delete_downstream=delete_downstream):
             return False
-        node = self.heads[first_letter]
-        for letter in word[1:]:
-            node = getattr(node, letter, void)
-            if not node:
+        if delete_downstream:
+            for depth in range(len(path) - 2, -1, -1):
+                path[depth].refresh(word[:depth], self.top_k_size)
+        else:
+            self._update_tops(path, word, decreased=True, deleted=True)
+        return True
+
+    def _update_tops(self, path: list_type[_WeightedTrieNode], word: str, decreased: bool, deleted: bool) -> void:
+        # Bottom-up, so that children are always up to date when a node has to be rebuilt from them
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if deleted and node.size == 0:
+                # Pruned from the trie
+                continue
+            removed = node.withdraw(word)
+            # Are there words in the subtree (besides this one) which aren't in the top list?
+            hidden = node.size - (not deleted) > len(node.top)
+            if removed and hidden and decreased:
+                node.refresh(word[:depth], self.top_k_size)
+            elif not deleted:
+                node.offer(word, path[-1].weight, self.top_k_size)
+
+    def top_k(self, prefix: str, k: int = None,
+              with_weights: bool = False) -> list_type[str | tuple_type[str, Number_t]]:
+        """
+        The k highest-weighted completions of the prefix (including the prefix itself if it's a word), best first.
+        Ties are broken alphabetically.
+
+        :param prefix: The word or word partial to complete
+        :param k: Number of results. Leave blank for top_k_size. Anything above top_k_size falls back to walking the
+        whole subtree.
+        :param with_weights: Return (word, weight) pairs instead of just words
+        """
+        if len(prefix) == 0:
+            raise EmptyInputException
+        k = self.top_k_size if k is None else k
+        node = self._root.find(prefix.casefold(), 0)
+        if node is None or k <= 0:
+            return []
+        if k <= self.top_k_size:
+            top = node.top[:k]
+        else:
+            top = nsmallest(self._iter_weighted(node, prefix.casefold()), k)
+        if with_weights:
+            return [(word, -weight) for weight, word in top]
+        return [word for _, word in top]
+
+    @staticmethod
+    def _iter_weighted(node: _WeightedTrieNode, prefix: str) -> Iterable[tuple_type[Number_t, str]]:
+        stack = [(node, prefix)]
+        while stack:
+            node, word = stack.pop()
+            if node.complete:
+                yield -node.weight, word
+            for child in node.children.values():
+                stack.append((child, word + child.character))
+
+
+class FrozenTrie:
+    """
+    Immutable, compact snapshot of a Trie (see Trie.freeze()). Nodes are stored level by level in flat arrays, so the
+    children of a node are contiguous and sorted, and are found with a binary search:
+
+    first_child[i]..first_child[i + 1]  the children of node i
+    label_offset[i]..label_offset[i + 1]  UTF-8 bytes of the edge label leading to node i (longer than one
+                                          character for RadixTrie snapshots)
+    key[i]                              code point of the first character of that label
+    complete[i]                         does node i correspond to a word?
+
+    The whole thing is a single buffer which can be written to a file with save() and opened with FrozenTrie.open().
+    An opened snapshot is memory-mapped and used in place, so many processes opening the same file share its pages
+    and startup doesn't rebuild anything. Weights of a WeightedTrie are not kept.
+
+    Usage:
+
+    >>> trie_.freeze().save('/srv/dictionary.trie')
+    >>> # In every worker process
+    >>> with FrozenTrie.open('/srv/dictionary.trie') as frozen:
+    >>>     frozen.exists('hello')
+    >>>     frozen.search('hel', max_results=10)
+    """
+
+    _MAGIC: const(bytes) = b'FTRIE001'
+    # magic, is little endian, node count, label bytes, number of words
+    _HEADER: const(struct.Struct) = struct.Struct('<8s?7xQQQ')
+
+    def __init__(self, buffer: bytes | mmap.mmap) -> void:
+        """
+        Do not use directly! Use Trie.freeze() or FrozenTrie.open() instead.
+        """
+        self._buffer: bytes | mmap.mmap = buffer
+        self._file_h = None
+        if len(buffer) < self._HEADER.size:
+            raise CorruptedTrieFileException
+        magic, little_endian, node_count, label_bytes, self.size = self._HEADER.unpack_from(buffer, 0)
+        if magic != self._MAGIC:
+            raise CorruptedTrieFileException
+        if little_endian != (sys.byteorder == 'little'):
+            raise CorruptedTrieFileException
+        # first_child, label_offset, key, complete and labels, see the class docstring
+        if len(buffer) != self._HEADER.size + 13 * node_count + 8 + label_bytes:
+            raise CorruptedTrieFileException
+        self.node_count: const(int) = node_count
+        view = memoryview(buffer)
+        offset = self._HEADER.size
+        self._first_child: memoryview = view[offset:offset + 4 * (node_count + 1)].cast('I')
+        offset += 4 * (node_count + 1)
+        self._label_offset: memoryview = view[offset:offset + 4 * (node_count + 1)].cast('I')
+        offset += 4 * (node_count + 1)
+        self._key: memoryview = view[offset:offset + 4 * node_count].cast('I')
+        offset += 4 * node_count
+        self._complete: memoryview = view[offset:offset + node_count]
+        offset += node_count
+        self._labels: memoryview = view[offset:offset + label_bytes]
+        if node_count == 0 or self._first_child[node_count] != node_count \
+                or self._label_offset[node_count] != label_bytes:
+            self.close()
+            raise CorruptedTrieFileException
+
+    @classmethod
+    def from_trie(cls, trie: 'Trie') -> 'FrozenTrie':
+        first_child, label_offset, key = array('I'), array('I', [0]), array('I')
+        complete, labels = bytearray(), bytearray()
+        order = [trie._root]
+        next_child = 1
+        for node in order:
+            first_child.append(next_child)
+            children = [node.children[char_] for char_ in sorted(node.children)]
+            order.extend(children)
+            next_child += len(children)
+            labels += node.character.encode('utf-8')
+            label_offset.append(len(labels))
+            key.append(ord(node.character[0]) if node.character else 0)
+            complete.append(node.complete)
+        first_child.append(next_child)
+        header = cls._HEADER.pack(cls._MAGIC, sys.byteorder == 'little', len(order), len(labels), trie.size)
+        return cls(b''.join((header, first_child.tobytes(), label_offset.tobytes(), key.tobytes(),
+                             bytes(complete), bytes(labels))))
+
+    @classmethod
+    def open(cls, path: str) -> 'FrozenTrie':
+        """
+        Memory-map a snapshot written by save(). Nothing is read until it's needed.
+        """
+        file_h = open(path, 'rb')
+        buffer = None
+        try:
+            if os.fstat(file_h.fileno()).st_size == 0:
+                raise CorruptedTrieFileException
+            buffer = mmap.mmap(file_h.fileno(), 0, access=mmap.ACCESS_READ)
+            rv = cls(buffer)
+        except Exception:
+            if buffer is not None and not buffer.closed:
+                buffer.close()
+            file_h.close()
+            raise
+        rv._file_h = file_h
+        return rv
+
+    def save(self, path: str) -> void:
+        safe_fwrite(path, self._buffer, mode='wb')
+
+    def close(self) -> void:
+        for view in (self._first_child, self._label_offset, self._key, self._complete, self._labels):
+            view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        if self._file_h is not None:
+            self._file_h.close()
+
+    def __enter__(self) -> 'FrozenTrie':
+        return self
+
+    def __exit__(self, *a, **k) -> void:
+        self.close()
+
+    def _label(self, node: int) -> str:
+        start, end = self._label_offset[node], self._label_offset[node + 1]
+        if end - start == 1:
+            # Single ASCII character, which is the node's key. Saves decoding for the vast majority of plain tries.
+            return chr(self._key[node])
+        return str(self._labels[start:end], 'utf-8')
+
+    def _child(self, node: int, character: str) -> int:
+        """
+        :return: Index of the child whose label starts with the character, or -1
+        """
+        code_point = ord(character)
+        low, high = self._first_child[node], self._first_child[node + 1]
+        key = self._key
+        while low < high:
+            middle = (low + high) >> 0x01
+            if key[middle] < code_point:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._first_child[node + 1] and key[low] == code_point:
+            return low
+        return -1
+
+    def _find_prefix(self, word: str) -> safe_type(tuple_type[int, str]):
+        node, i = 0, 0
+        while i < len(word):
+            node = self._child(node, word[i])
+            if node < 0:
+                return
+            label = self._label(node)
+            common = _common_prefix_length(label, word, i)
+            if i + common == len(word):
+                return node, word + label[common:]
+            if common < len(label):
+                return
+            i += common
+        return node, word
+
+    def exists(self, word: str) -> bool:
+        """
+        Does a word exist? (Partials not matched)
+        """
+        if len(word) == 0:
+            raise EmptyInputException
+        word = word.casefold()
+        node, i = 0, 0
+        while i < len(word):
+            node = self._child(node, word[i])
+            if node < 0:
                 return False
-        return getattr(node, 'complete', False)
+            label = self._label(node)
+            if not word.startswith(label, i):
+                return False
+            i += len(label)
+        return bool(self._complete[node])
+
+    def iter_search(self, word: str) -> Iterator[str]:
+        """
+        Lazily yield the completions of a word (including itself), in lexicographic order.
+        """
+        if len(word) == 0:
+            raise EmptyInputException
+        found = self._find_prefix(word.casefold())
+        if found is None:
+            return
+        first_child, complete = self._first_child, self._complete
+        parts = []
+        stack = [(found[0], found[1], 0)]
+        while stack:
+            node, label, depth = stack.pop()
+            del parts[depth:]
+            parts.append(label)
+            if complete[node]:
+                yield ''.join(parts)
+            for child in range(first_child[node + 1] - 1, first_child[node] - 1, -1):
+                stack.append((child, self._label(child), depth + 1))
+
+    def search(self, word: str, max_results: int = None) -> list_type[str]:
+        """
+        Same as Trie.search(), except that results are in lexicographic order and nothing is cached.
+        """
+        return list(itertools.islice(self.iter_search(word), max_results or None))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __str__(self) -> str:
+        return f"FrozenTrie(words={self.size}, nodes={self.node_count}, bytes={len(self._buffer)})"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+def _next_levenshtein_row(previous_row: list_type[int], character: str, word: str) -> list_type[int]:
+    """
+    Next row of the edit distance matrix between `word` and a string, after appending `character` to that string
+    """
+    row = [previous_row[0] + 1]
+    for i in range(1, len(previous_row)):
+        cost = previous_row[i - 1] + (word[i - 1] != character)
+        row.append(min(row[i - 1] + 1, previous_row[i] + 1, cost))
+    return row
+
+
+def _common_prefix_length(label: str, word: str, index: int) -> int:
+    """
+    Length of the common prefix of label and word[index:]
+    """
+    length = min(len(label), len(word) - index)
+    for i in range(length):
+        if label[i] != word[index + i]:
+            return i
+    return length
 
 
 def iterable_to_set(charset: Iterable[str]) -> set[str]:
@@ -242,6 +1095,25 @@ class InvalidCharacterException(Exception):
         return message
 
 
+class CorruptedTrieFileException(Exception):
+
+    def __str__(self) -> str:
+        message = "The buffer is not a FrozenTrie snapshot, is corrupted or was written on a machine with a " \
+                  "different byte order"
+        return message
+
+
+class UnsortedInputException(Exception):
+
+    def __init__(self, previous: str, word: str) -> void:
+        self.previous: const(str) = previous
+        self.word: const(str) = word
+
+    def __str__(self) -> str:
+        message = f"The input was declared as sorted, but {self.word} came after {self.previous}"
+        return message
+
+
 class EmptyInputException(Exception):
 
     def __str__(self) -> str:
@@ -0,0 +1,209 @@
+from typing import Any, Hashable, Iterable, Iterator
+
+from data_structures.trie import InvalidCharacterException
+from types_extensions import void, safe_type, string_like, list_type, tuple_type
+
+
+class _Missing:
+    """
+    Marks a node without a value, since None is a perfectly good value.
+    """
+
+    def __repr__(self) -> str:
+        return '<missing>'
+
+
+_MISSING = _Missing()
+
+
+class _TrieMapNode:
+    """
+    Do not use this class directly.
+    self.value = The value stored under the key this node corresponds to, or _MISSING
+    """
+
+    __slots__ = ('children', 'value')
+
+    def __init__(self) -> void:
+        self.children: dict[Hashable, _TrieMapNode] = {}
+        self.value: Any = _MISSING
+
+
+class TrieMap:
+    """
+    A mapping from keys (str or bytes) to values, stored as a trie so that prefix queries are cheap. Useful for
+    routing tables and the like, where the question is "which stored key is the longest prefix of this one?".
+    Unlike the Trie, keys are taken as-is: they are not casefolded and, unless an alphabet is given, any character
+    (or byte) is allowed. The empty key is allowed too and acts as a catch-all for longest_prefix().
+
+    All keys of a map must be of the same type.
+
+    Usage:
+
+    >>> routes = TrieMap()
+    >>> routes['/api'] = 'api-service'
+    >>> routes['/api/v2'] = 'api-v2-service'
+    >>> routes.longest_prefix('/api/v2/users')
+    ('/api/v2', 'api-v2-service')
+    >>> routes.all_prefixes('/api/v2/users')
+    [('/api', 'api-service'), ('/api/v2', 'api-v2-service')]
+    """
+
+    def __init__(self, data: Iterable[tuple_type[string_like, Any]] = None,
+                 alphabet: Iterable[str | int] = None) -> void:
+        """
+        :param data: Optional (key, value) pairs to start with
+        :param alphabet: Optional set of allowed characters (or byte values for bytes keys)
+        """
+        self._root: _TrieMapNode = _TrieMapNode()
+        self._size: int = 0
+        self._key_type: safe_type(type) = None
+        self.alphabet: safe_type(frozenset) = frozenset(alphabet) if alphabet is not None else None
+        for key, value in data or ():
+            self[key] = value
+
+    def _check_key(self, key: string_like) -> void:
+        if not isinstance(key, (str, bytes)):
+            raise TypeError(f"TrieMap keys must be str or bytes, not {type(key).__name__}")
+        if self._key_type is None:
+            self._key_type = type(key)
+        elif not isinstance(key, self._key_type):
+            raise TypeError(f"This TrieMap holds {self._key_type.__name__} keys, not {type(key).__name__}")
+        if self.alphabet is not None and not self.alphabet.issuperset(key):
+            invalid = next(element for element in key if element not in self.alphabet)
+            raise InvalidCharacterException(invalid, self.alphabet)
+
+    def _join(self, parts: list_type[str | int]) -> string_like:
+        if self._key_type is bytes:
+            return bytes(parts)
+        return ''.join(parts)
+
+    def _find(self, key: string_like) -> safe_type(_TrieMapNode):
+        node = self._root
+        for element in key:
+            node = node.children.get(element)
+            if node is None:
+                return
+        return node
+
+    def __setitem__(self, key: string_like, value: Any) -> void:
+        self._check_key(key)
+        node = self._root
+        for element in key:
+            child = node.children.get(element)
+            if child is None:
+                child = node.children[element] = _TrieMapNode()
+            node = child
+        if node.value is _MISSING:
+            self._size += 1
+        node.value = value
+
+    def __getitem__(self, key: string_like) -> Any:
+        node = self._find(key)
+        if node is None or node.value is _MISSING:
+            raise KeyError(key)
+        return node.value
+
+    def get(self, key: string_like, default: Any = None) -> Any:
+        node = self._find(key)
+        if node is None or node.value is _MISSING:
+            return default
+        return node.value
+
+    def __delitem__(self, key: string_like) -> void:
+        path = [self._root]
+        for element in key:
+            node = path[-1].children.get(element)
+            if node is None:
+                raise KeyError(key)
+            path.append(node)
+        if path[-1].value is _MISSING:
+            raise KeyError(key)
+        path[-1].value = _MISSING
+        self._size -= 1
+        # Prune the branch back up to the nearest node which still holds a value or leads to one
+        for i in range(len(path) - 1, 0, -1):
+            node = path[i]
+            if node.value is not _MISSING or node.children:
+                break
+            del path[i - 1].children[key[i - 1]]
+
+    def __contains__(self, key: string_like) -> bool:
+        node = self._find(key)
+        return node is not None and node.value is not _MISSING
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[string_like]:
+        return self.keys()
+
+    def longest_prefix(self, key: string_like, default: Any = None) -> tuple_type[string_like, Any] | Any:
+        """
+        Find the longest stored key which is a prefix of the given key (including the key itself) in a single walk.
+
+        :return: A (stored key, value) pair, or `default` if no stored key is a prefix of the given one
+        """
+        node = self._root
+        best_length = 0 if node.value is not _MISSING else -1
+        best_value = node.value
+        for i, element in enumerate(key):
+            node = node.children.get(element)
+            if node is None:
+                break
+            if node.value is not _MISSING:
+                best_length, best_value = i + 1, node.value
+        if best_length < 0:
+            return default
+        return key[:best_length], best_value
+
+    def all_prefixes(self, key: string_like) -> list_type[tuple_type[string_like, Any]]:
+        """
+        All stored keys which are prefixes of the given key (including the key itself), shortest first.
+
+        :return: A list of (stored key, value) pairs
+        """
+        node = self._root
+        rv = [(key[:0], node.value)] if node.value is not _MISSING else []
+        for i, element in enumerate(key):
+            node = node.children.get(element)
+            if node is None:
+                break
+            if node.value is not _MISSING:
+                rv.append((key[:i + 1], node.value))
+        return rv
+
+    def items(self, prefix: string_like = None) -> Iterator[tuple_type[string_like, Any]]:
+        """
+        Lazily yield the (key, value) pairs whose keys start with the prefix (all of them if not given), depth-first
+        in insertion order.
+        """
+        prefix = prefix if prefix is not None else (b'' if self._key_type is bytes else '')
+        node = self._find(prefix)
+        if node is None:
+            return
+        parts = list(prefix)
+        stack = [(node, None, len(parts))]
+        while stack:
+            node, element, depth = stack.pop()
+            del parts[depth:]
+            if element is not None:
+                parts.append(element)
+            if node.value is not _MISSING:
+                yield self._join(parts), node.value
+            for child_element, child in reversed(node.children.items()):
+                stack.append((child, child_element, len(parts)))
+
+    def keys(self, prefix: string_like = None) -> Iterator[string_like]:
+        for key, _ in self.items(prefix):
+            yield key
+
+    def values(self, prefix: string_like = None) -> Iterator[Any]:
+        for _, value in self.items(prefix):
+            yield value
+
+    def __str__(self) -> str:
+        return f"TrieMap(size={self._size})"
+
+    def __repr__(self) -> str:
+        return str(self)
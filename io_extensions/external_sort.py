@@ -0,0 +1,136 @@
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Iterable, Iterator
+
+from data_structures.heap_utils import merge
+from io_extensions.file_rw import safe_make_dirs
+from types_extensions import void, Function, safe_type, list_type
+
+_DEFAULT_MEMORY_BUDGET: int = 64 * 1024 * 1024
+# Records are pickled in blocks rather than one by one, which keeps run files compact and reads fast
+_SPILL_BLOCK_SIZE: int = 4096
+
+
+def _spill_run(records: list_type[Any], key: safe_type(Function), reverse: bool, path: str) -> str:
+    records.sort(key=key, reverse=reverse)
+    with open(path, 'wb') as file_h:
+        for start in range(0, len(records), _SPILL_BLOCK_SIZE):
+            pickle.dump(records[start:start + _SPILL_BLOCK_SIZE], file_h, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path: str) -> Iterator[Any]:
+    with open(path, 'rb') as file_h:
+        while True:
+            try:
+                block = pickle.load(file_h)
+            except EOFError:
+                return
+            yield from block
+
+
+def _iter_runs(iterable: Iterable[Any], memory_budget: int,
+               max_run_records: safe_type(int)) -> Iterator[list_type[Any]]:
+    run, run_bytes = [], 0
+    for record in iterable:
+        run.append(record)
+        run_bytes += sys.getsizeof(record)
+        if run_bytes >= memory_budget or (max_run_records and len(run) >= max_run_records):
+            yield run
+            run, run_bytes = [], 0
+    if run:
+        yield run
+
+
+def external_sort(iterable: Iterable[Any], key: Function = None, reverse: bool = False,
+                  memory_budget: int = _DEFAULT_MEMORY_BUDGET, max_run_records: int = None,
+                  workers: int = 1, tmp_dir: str = None) -> Iterator[Any]:
+    """
+    Sort an iterable which doesn't fit in memory. The input is cut into runs of roughly `memory_budget` bytes, each
+    run is sorted and spilled to a temporary file, and the runs are then lazily k-way merged through a heap.
+    Inputs that fit in a single run are sorted in memory without touching the disk.
+
+    The temporary files are removed once the returned generator is exhausted or closed.
+
+    Usage:
+
+    >>> with open('huge.csv') as file_h:
+    >>>     for line in external_sort(file_h, key=lambda l: l.split(',')[3], memory_budget=256 * 1024 * 1024):
+    >>>         ...
+
+    :param iterable: Records to sort. They must be picklable.
+    :param key: Same as for sorted(). Must be picklable (so no lambdas) if workers > 1
+    :param reverse: Same as for sorted()
+    :param memory_budget: Approximate size in bytes of a single run, estimated with sys.getsizeof() per record.
+    With workers > 1, up to workers + 1 runs can be in memory at the same time.
+    :param max_run_records: Optional hard limit of records per run
+    :param workers: Number of processes sorting and spilling runs in parallel. 1 means everything runs in-process.
+    :param tmp_dir: Where to put the run files. Defaults to the system temp dir.
+    :return: A generator of the sorted records
+    """
+    runs = _iter_runs(iterable, memory_budget, max_run_records)
+    first_run = next(runs, None)
+    if first_run is None:
+        return
+    second_run = next(runs, None)
+    if second_run is None:
+        first_run.sort(key=key, reverse=reverse)
+        yield from first_run
+        return
+
+    # Only the list refers to the runs we peeked at, so each can be freed as soon as it is spilled
+    peeked_runs = [first_run, second_run]
+    del first_run, second_run
+    run_dir = tempfile.mkdtemp(prefix='external-sort-', dir=tmp_dir)
+    try:
+        paths = _spill_runs(_chain_runs(peeked_runs, runs), key, reverse, workers, run_dir)
+        yield from merge(*(_read_run(path) for path in paths), key=key, reverse=reverse)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def _chain_runs(peeked_runs: list_type[list_type[Any]], runs: Iterator[list_type[Any]]) -> Iterator[list_type[Any]]:
+    while peeked_runs:
+        yield peeked_runs.pop(0)
+    yield from runs
+
+
+def _spill_runs(all_runs: Iterator[list_type[Any]], key: safe_type(Function), reverse: bool, workers: int,
+                run_dir: str) -> list_type[str]:
+    paths = []
+    if workers <= 1:
+        for idx, run in enumerate(all_runs):
+            paths.append(_spill_run(run, key, reverse, os.path.join(run_dir, f'run-{idx}')))
+            del run
+        return paths
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: list_type[Future] = []
+        for idx, run in enumerate(all_runs):
+            if len(pending) >= workers:
+                # Don't read further ahead than the pool can sort, otherwise the memory budget means nothing
+                paths.append(pending.pop(0).result())
+            pending.append(executor.submit(_spill_run, run, key, reverse, os.path.join(run_dir, f'run-{idx}')))
+            del run
+        paths.extend(future.result() for future in pending)
+    return paths
+
+
+def external_sort_file(input_path: str, output_path: str, key: Function = None, reverse: bool = False,
+                       memory_budget: int = _DEFAULT_MEMORY_BUDGET, max_run_records: int = None,
+                       workers: int = 1, tmp_dir: str = None, encoding: str = 'utf-8') -> void:
+    """
+    Sort the lines of a text file into another file. See external_sort() for the parameters.
+    Lines are compared with their trailing newline stripped, and a missing newline on the last line is added.
+    """
+    safe_make_dirs(output_path)
+    with open(input_path, 'r', encoding=encoding) as in_h, open(output_path, 'w', encoding=encoding) as out_h:
+        lines = (line.rstrip('\n') for line in in_h)
+        for line in external_sort(lines, key=key, reverse=reverse, memory_budget=memory_budget,
+                                  max_run_records=max_run_records, workers=workers, tmp_dir=tmp_dir):
+            out_h.write(line)
+            out_h.write('\n')
@@ -1,4 +1,7 @@
-from types_extensions import tuple_type
+from typing import Iterable, Iterator
+
+from data_structures.aho_corasick import AhoCorasick
+from types_extensions import tuple_type, string_like
 
 
 def split_string(str_: str, index: int) -> tuple_type[str, str]:
@@ -8,3 +11,13 @@ def split_string(str_: str, index: int) -> tuple_type[str, str]:
     if index >= len(str_):
         raise IndexError
     return str_[:index], str_[index:]
+
+
+def find_all(text: string_like, patterns: Iterable[string_like]) -> Iterator[tuple_type[int, string_like]]:
+    """
+    Find every occurrence of any of the patterns in a single pass over the text (see AhoCorasick), instead of calling
+    str.find() once per pattern. Compile an AhoCorasick yourself if you scan more than one text with the same patterns.
+
+    :return: A generator of (offset, pattern)
+    """
+    return AhoCorasick(patterns).scan(text)
@@ -1,3 +1,6 @@
 from .callback_thread import CallbackThread
 from .return_value_thread import ReturnValueThread
-from .goroutine import go, GoRoutine, Channel
+from .goroutine import go, select, GoRoutine, Channel, WaitGroup
+from .goroutine_pool import GoPool, default_pool, set_default_pool
+from .work_stealing_pool import WorkStealingPool
+from .background_loop import background_loop
@@ -0,0 +1,60 @@
+import asyncio
+import concurrent.futures
+import traceback
+from threading import Thread, Lock
+from typing import Coroutine
+
+from types_extensions import void, safe_type, const, Number_t
+
+_loop: safe_type(asyncio.AbstractEventLoop) = None
+_loop_lock: const(Lock) = Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """
+    :return: The process-wide event loop go() runs coroutine functions on, started in a daemon thread on first use
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                Thread(target=loop.run_forever, name='GoBackgroundLoop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+class _CoroutineTask:
+    """
+    Do not use directly! Returned by run_coroutine().
+    Mirrors the parts of the Thread API GoRoutine relies on: `finished` and join().
+    """
+
+    __slots__ = ('_future',)
+
+    def __init__(self, future: concurrent.futures.Future) -> void:
+        self._future: const(concurrent.futures.Future) = future
+        future.add_done_callback(self._report)
+
+    @staticmethod
+    def _report(future: concurrent.futures.Future) -> void:
+        if not future.cancelled() and (exception := future.exception()) is not None:
+            traceback.print_exception(type(exception), exception, exception.__traceback__)
+
+    @property
+    def finished(self) -> bool:
+        return self._future.done()
+
+    def join(self, timeout: Number_t = None) -> bool:
+        """
+        :return: True if the coroutine finished within the timeout
+        """
+        done, _ = concurrent.futures.wait((self._future,), timeout)
+        return bool(done)
+
+
+def run_coroutine(coroutine: Coroutine) -> _CoroutineTask:
+    """
+    Schedule a coroutine on the background loop from any thread.
+    """
+    return _CoroutineTask(asyncio.run_coroutine_threadsafe(coroutine, background_loop()))
@@ -1,27 +1,107 @@
-from threading import Thread, RLock
+import asyncio
+import inspect
+import random
+import time
+from collections import deque
+from queue import Full
+from threading import Thread, Lock, Condition, Event
 from typing import Any, Iterable, Mapping, Generator
 
-from types_extensions import Function, void, safe_type, const, Number_t
+from thread_extensions.background_loop import _CoroutineTask, run_coroutine
+from thread_extensions.goroutine_pool import GoPool, _PoolTask
+from types_extensions import Function, void, safe_type, const, Number_t, tuple_type
 
 
 class WaitGroup:
     """
     A waitgroup which behaves like Go's waitgroup object. A number of items to wait for can be incremented and
     decremented, and you can force a thread to wait until all waited items are done.
+    Waiting threads sleep on a condition and are woken up when the counter drops to 0.
+
+    Usage:
+
+    >>> wg = WaitGroup()
+    >>> for url in urls:
+    >>>     go(download, None, url, wait_group=wg)
+    >>> if not wg.wait(timeout=30):
+    >>>     print('Some downloads are still running')
+    """
+
+    def __init__(self, items_to_wait: int = 0) -> void:
+        if items_to_wait < 0:
+            raise NegativeWaitGroupCounterException(items_to_wait)
+        self._waiting: int = items_to_wait
+        self._condition: Condition = Condition(Lock())
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def add(self, delta: int = 1) -> void:
+        """
+        Adjust the counter by delta, waking up the waiting threads if it drops to 0.
+        The counter is left untouched if it would become negative.
+        """
+        with self._condition:
+            waiting = self._waiting + delta
+            if waiting < 0:
+                raise NegativeWaitGroupCounterException(waiting)
+            self._waiting = waiting
+            if waiting == 0:
+                self._condition.notify_all()
+
+    def wait(self, timeout: Number_t = None) -> bool:
+        """
+        Block until the counter drops to 0, or the timeout (if given) expires.
+
+        :return: True if the counter dropped to 0, False on timeout
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._waiting == 0, timeout)
+
+    def done(self, delta: int = 1) -> void:
+        self.add(-delta)
+
+
+class NegativeWaitGroupCounterException(Exception):
+
+    def __init__(self, counter: int) -> void:
+        self.counter: const(int) = counter
+
+    def __str__(self) -> str:
+        message = f"WaitGroup counter would become negative ({self.counter}). done() was called too many times."
+        return message
+
+
+class _AsyncWaiter:
     """
+    Stands in for a select() Event on behalf of a coroutine. The channel sets it from whichever thread changed it, and
+    the wakeup is handed over to the coroutine's event loop.
+    """
+
+    __slots__ = ('_loop', '_future')
 
-    def __init__(self, items_to_wait: int = 0):
-        self.waiting: int = items_to_wait
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> void:
+        self._loop: const(asyncio.AbstractEventLoop) = loop
+        self._future: asyncio.Future = loop.create_future()
 
-    def add(self, delta: int = 1):
-        self.waiting += delta
+    def set(self) -> void:
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # The loop is closed, nobody is waiting anymore
+            pass
 
-    def wait(self):
-        while self.waiting > 0:
-            ...
+    def _wake(self) -> void:
+        if not self._future.done():
+            self._future.set_result(None)
 
-    def done(self, delta: int = 1):
-        self.waiting -= delta
+    def reset(self) -> void:
+        if self._future.done():
+            self._future = self._loop.create_future()
+
+    async def wait(self) -> void:
+        await self._future
 
 
 class ChannelClosed(Exception):
@@ -34,12 +114,24 @@ class Channel:
     """
     A multi-threaded buffered communication medium for GoRoutines.
     It can be polled, iterated-over, and closed (rendering it read-only)
+    Coroutines can use it too, without blocking their event loop, through get_async(), put_async() and `async for`.
+
+    Waiting consumers (and producers, if the channel has a maxsize) sleep on a condition instead of spinning, and are
+    woken up as soon as there is something for them to do or the channel is closed.
     """
 
-    def __init__(self) -> void:
-        self._lock: RLock = RLock()
-        self._buffer: list[Any] = []
+    def __init__(self, maxsize: int = 0) -> void:
+        """
+        :param maxsize: Maximum number of buffered items, beyond which put() blocks. 0 or less means unbounded.
+        """
+        self.maxsize: int = maxsize
+        self._lock: Lock = Lock()
+        self._not_empty: Condition = Condition(self._lock)
+        self._not_full: Condition = Condition(self._lock)
+        self._buffer: deque[Any] = deque()
         self._closed: bool = False
+        # Events of the select() calls and coroutines currently watching this channel
+        self._waiters: set[Event | _AsyncWaiter] = set()
 
     @property
     def is_closed(self) -> bool:
@@ -50,54 +142,289 @@ class Channel:
         with self._lock:
             return len(self._buffer)
 
-    def put(self, obj: Any, safe: bool = True):
+    def _is_full(self) -> bool:
+        return 0 < self.maxsize <= len(self._buffer)
+
+    def _wake_waiters(self) -> void:
+        for waiter in self._waiters:
+            waiter.set()
+
+    def _push(self, obj: Any) -> void:
+        # The lock must be held
+        self._buffer.append(obj)
+        self._not_empty.notify()
+        if self._waiters:
+            self._wake_waiters()
+
+    def _pop(self) -> Any:
+        # The lock must be held and the buffer not empty
+        obj = self._buffer.popleft()
+        self._not_full.notify()
+        if self._waiters:
+            self._wake_waiters()
+        return obj
+
+    def _add_waiter(self, waiter: Event | _AsyncWaiter) -> void:
+        with self._lock:
+            self._waiters.add(waiter)
+
+    def _remove_waiter(self, waiter: Event | _AsyncWaiter) -> void:
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    def _try_receive(self) -> tuple_type[bool, Any]:
+        """
+        Non-blocking receive for select(). A closed and drained channel is always ready and yields None.
+        """
+        with self._lock:
+            if self._buffer:
+                return True, self._pop()
+            return self._closed, None
+
+    def _try_send(self, obj: Any) -> bool:
+        """
+        Non-blocking send for select(). Sending to a closed channel raises ChannelClosed.
+        """
+        with self._lock:
+            if self._closed:
+                raise ChannelClosed
+            if self._is_full():
+                return False
+            self._push(obj)
+            return True
+
+    def put(self, obj: Any, safe: bool = True, block: bool = True, timeout: Number_t = None) -> void:
         """
         Adds a new object to the output buffer if the channel is not closed.
-        If the channel is closed:
+        If the channel is full (see maxsize), waits for room, up to `timeout` seconds if given. queue.Full is raised if
+        there is still no room after that, or straight away if `block` is False.
+        If the channel is closed (even while waiting for room):
             If the safe option is True, it will gracefully return.
             If the safe option is False, an exception will be raised, notifying the user that the channel is closed.
         """
-        with self._lock:
-            if not self._closed:
-                self._buffer.append(obj)
-            else:
+        with self._not_full:
+            if self._is_full() and not self._closed:
+                if not block or not self._not_full.wait_for(lambda: not self._is_full() or self._closed, timeout):
+                    raise Full
+            if self._closed:
                 if safe:
                     return
                 raise ChannelClosed
+            self._push(obj)
 
-    def poll(self, block: bool = True) -> Any:
+    def poll(self, block: bool = True, timeout: Number_t = None) -> Any:
         """
         A potentially-blocking operation to get the next value in the buffer.
-        If the block operation is true, the polling thread will be locked until an item is placed in the buffer,
-        otherwise it will return None.
+        If the block operation is true, the polling thread sleeps until an item is placed in the buffer, the channel
+        is closed or the timeout (if given) expires, otherwise it will return None straight away.
+        Returns None if nothing could be read, like a receive from a closed channel in Go.
+        """
+        with self._not_empty:
+            if not self._buffer:
+                if not block or self._closed:
+                    return
+                if not self._not_empty.wait_for(lambda: self._buffer or self._closed, timeout) or not self._buffer:
+                    return
+            return self._pop()
+
+    def _poll_until_closed(self) -> tuple_type[bool, Any]:
+        with self._not_empty:
+            self._not_empty.wait_for(lambda: self._buffer or self._closed)
+            if not self._buffer:
+                return False, None
+            return True, self._pop()
 
+    def iter(self) -> Generator:
+        """
+        A blocking iterator of the Channel's buffer, like `range ch` in Go. It waits for new items and only stops once
+        the channel is closed and everything in it has been read.
         """
-        while self.size == 0:
-            if block:
-                ...
-            else:
+        while True:
+            received, obj = self._poll_until_closed()
+            if not received:
                 return
+            yield obj
+
+    def __iter__(self) -> Generator:
+        return self.iter()
+
+    def __next__(self) -> Any:
+        received, obj = self._poll_until_closed()
+        if not received:
+            raise StopIteration
+        return obj
+
+    def close(self) -> void:
         with self._lock:
-            return self._buffer.pop(0)
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+            self._wake_waiters()
+
+    async def _receive_async(self) -> tuple_type[bool, Any]:
+        waiter = None
+        try:
+            while True:
+                with self._lock:
+                    if self._buffer:
+                        return True, self._pop()
+                    if self._closed:
+                        return False, None
+                    if waiter is None:
+                        waiter = _AsyncWaiter(asyncio.get_running_loop())
+                        self._waiters.add(waiter)
+                    else:
+                        waiter.reset()
+                await waiter.wait()
+        finally:
+            if waiter is not None:
+                self._remove_waiter(waiter)
+
+    async def get_async(self) -> Any:
+        """
+        Awaitable counterpart of poll(): suspends the calling coroutine (not the event loop) until an item is
+        available or the channel is closed.
+        Returns None if the channel is closed and drained.
+        """
+        _, obj = await self._receive_async()
+        return obj
 
-    def iter(self) -> Generator:
+    async def put_async(self, obj: Any, safe: bool = True) -> void:
         """
-        A continuous iterator of the Channel's buffer. This can read while items are being written.
+        Awaitable counterpart of put(): suspends the calling coroutine while the channel is full.
+        If the channel is closed, returns gracefully if safe is True, otherwise raises ChannelClosed.
         """
-        while self.size > 0:
-            yield self.poll(block=False)
+        waiter = None
+        try:
+            while True:
+                with self._lock:
+                    if self._closed:
+                        if safe:
+                            return
+                        raise ChannelClosed
+                    if not self._is_full():
+                        self._push(obj)
+                        return
+                    if waiter is None:
+                        waiter = _AsyncWaiter(asyncio.get_running_loop())
+                        self._waiters.add(waiter)
+                    else:
+                        waiter.reset()
+                await waiter.wait()
+        finally:
+            if waiter is not None:
+                self._remove_waiter(waiter)
+
+    def __aiter__(self) -> 'Channel':
+        return self
+
+    async def __anext__(self) -> Any:
+        received, obj = await self._receive_async()
+        if not received:
+            raise StopAsyncIteration
+        return obj
+
+
+class _NoDefault:
+    """
+    Marks a select() without a default case, since None is a perfectly good default.
+    """
 
-    def __next__(self):
-        return self.poll()
+    def __repr__(self) -> str:
+        return '<no default>'
 
-    def close(self) -> void:
-        self._closed = True
+
+_NO_DEFAULT = _NoDefault()
+
+
+def select(*cases: Channel | tuple_type[Channel, Any], timeout: Number_t = None, default: Any = _NO_DEFAULT
+           ) -> tuple_type[int, Any]:
+    """
+    Wait on several channels at once, like Go's select statement. Each case is either a Channel to receive from or a
+    (Channel, value) pair to send the value to. Exactly one ready case is executed; when several are ready, one of
+    them is picked at random so that no channel gets starved.
+
+    A closed (and drained) channel is always ready to receive from and yields None, as in Go. Sending to a closed
+    channel raises ChannelClosed.
+
+    The calling thread sleeps until one of the channels changes, so there is no need to spin over poll(block=False).
+
+    Usage:
+
+    >>> while True:
+    >>>     idx, value = select(data_chan, control_chan, (results_chan, last_result), timeout=5)
+    >>>     if idx == 0:
+    >>>         handle(value)
+    >>>     elif idx == 1:
+    >>>         break
+    >>>     elif idx == -1:
+    >>>         print('Nothing happened for 5 seconds')
+
+    :param timeout: Maximum time to wait for a case to be ready, in seconds. Waits forever if not given.
+    :param default: If given (even as None), it is returned straight away when no case is ready, instead of waiting
+    at all
+    :return: (index of the executed case, received value or None for a send), or (-1, default) if no case was ready
+    in time
+    """
+    waiter = Event()
+    channels = {case if isinstance(case, Channel) else case[0] for case in cases}
+    order = list(range(len(cases)))
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    # Register before looking at the channels, so any change made after a channel is checked sets the event
+    for channel in channels:
+        channel._add_waiter(waiter)
+    try:
+        while True:
+            waiter.clear()
+            random.shuffle(order)
+            for idx in order:
+                case = cases[idx]
+                if isinstance(case, Channel):
+                    ready, obj = case._try_receive()
+                    if ready:
+                        return idx, obj
+                elif case[0]._try_send(case[1]):
+                    return idx, None
+            if default is not _NO_DEFAULT:
+                return -1, default
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0 or not waiter.wait(remaining):
+                return -1, None
+    finally:
+        for channel in channels:
+            channel._remove_waiter(waiter)
+
+
+def _run_routine(target: Function, args: Iterable[Any], kwargs: Mapping[str, Any], channel: Channel,
+                 wait_group: safe_type(WaitGroup)) -> void:
+    try:
+        try:
+            target(*args, channel=channel, **kwargs)
+        except TypeError:
+            target(*args, **kwargs)
+    finally:
+        if wait_group is not None:
+            wait_group.done()
+
+
+async def _run_coroutine_routine(target: Function, args: Iterable[Any], kwargs: Mapping[str, Any], channel: Channel,
+                                 wait_group: safe_type(WaitGroup)) -> void:
+    try:
+        try:
+            coroutine = target(*args, channel=channel, **kwargs)
+        except TypeError:
+            coroutine = target(*args, **kwargs)
+        await coroutine
+    finally:
+        if wait_group is not None:
+            wait_group.done()
 
 
 class _GoThread(Thread):
 
     def __init__(self, channel: Channel, group: void = None, target: Function = None, name: str = None,
-                 args: Iterable[Any] = (), kwargs: Mapping[str, Any] = None, *, daemon: bool = None) -> void:
+                 args: Iterable[Any] = (), kwargs: Mapping[str, Any] = None, *, daemon: bool = None,
+                 wait_group: WaitGroup = None) -> void:
         """
         Do not use directly! Use go() instead.
         """
@@ -106,18 +433,17 @@ class _GoThread(Thread):
         self._target: Function = target
         self._args: Iterable[Any] = args
         self._kwargs: safe_type(Mapping[str, Any]) = kwargs or {}
-        self._kwargs['channel'] = channel
+        self._channel: Channel = channel
+        self._wait_group: safe_type(WaitGroup) = wait_group
         self.finished: bool = False
 
     def run(self) -> void:
-        if self._target is not None:
-            try:
-                self._target(*self._args, **self._kwargs)
-            except TypeError:
-                del self._kwargs['channel']
-                self._target(*self._args, **self._kwargs)
-        self.finished = True
-        del self._target, self._args, self._kwargs
+        try:
+            if self._target is not None:
+                _run_routine(self._target, self._args, self._kwargs, self._channel, self._wait_group)
+        finally:
+            self.finished = True
+            del self._target, self._args, self._kwargs, self._channel, self._wait_group
 
 
 class GoRoutine:
@@ -126,23 +452,24 @@ class GoRoutine:
     A wrapper class for a goroutine's execution and its assigned channel.
     """
 
-    def __init__(self, executor: _GoThread, chan: Channel) -> void:
-        self.__executor: const(_GoThread) = executor
+    def __init__(self, executor: _GoThread | _PoolTask | _CoroutineTask, chan: Channel) -> void:
+        self.__executor: const(_GoThread | _PoolTask | _CoroutineTask) = executor
         self.channel: const(Channel) = chan
 
     @property
     def is_finished(self) -> bool:
         return self.__executor.finished
 
-    def poll(self, block: bool = True) -> Any:
-        return self.channel.poll(block)
+    def poll(self, block: bool = True, timeout: Number_t = None) -> Any:
+        return self.channel.poll(block, timeout)
 
     def stop(self, timeout: Number_t = None) -> void:
         self.channel.close()
         self.__executor.join(timeout)
 
 
-def go(func: Function, channel: Channel = None, *args, **kwargs) -> GoRoutine:
+def go(func: Function, channel: Channel = None, *args, wait_group: WaitGroup = None, pool: GoPool = None,
+       **kwargs) -> GoRoutine:
     """
     Main API for goroutines. You can pass a channel if needed, otherwise one will be created or you.
     If you wish to use the channel, you need to have an argument in your passed function/method called `channel` of
@@ -184,11 +511,40 @@ def go(func: Function, channel: Channel = None, *args, **kwargs) -> GoRoutine:
     Consumed: 5
 
     Note: Sometimes higher values can be produced (but not consumed) depending on the time to set the properties etc...
+
+    Pass a WaitGroup as `wait_group` to have it incremented now and decremented once the routine returns (or raises).
+
+    Every routine gets a dedicated thread, unless a GoPool is passed as `pool` (e.g. the process-wide default_pool()).
+    Pools save the thread start-up cost and bound the number of threads for many short routines, but routines which
+    wait for each other can starve a pool (see GoPool).
+
+    Coroutine functions are run on a shared background event loop instead (see background_loop()), and can use the
+    channel's async API:
+
+    >>> async def relay(channel: Channel):
+    >>>     async for item in channel:
+    >>>         await send_somewhere(item)
+    >>>
+    >>> routine = go(relay)
+    >>> routine.channel.put('hello')  # From any thread
     """
     channel = channel or Channel()
-    t_ = _GoThread(channel, target=func, args=args, kwargs=kwargs)
-    t_.start()
+    if wait_group is not None:
+        wait_group.add()
+    try:
+        if inspect.iscoroutinefunction(func):
+            executor = run_coroutine(_run_coroutine_routine(func, args, kwargs, channel, wait_group))
+        elif pool is not None:
+            executor = pool.submit(lambda: _run_routine(func, args, kwargs, channel, wait_group))
+        else:
+            executor = _GoThread(channel, target=func, args=args, kwargs=kwargs, wait_group=wait_group)
+            executor.start()
+    except BaseException:
+        # The routine will never run, so it will never mark itself as done either
+        if wait_group is not None:
+            wait_group.done()
+        raise
     return GoRoutine(
-        executor=t_,
+        executor=executor,
         chan=channel
     )
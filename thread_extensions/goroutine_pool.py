@@ -0,0 +1,202 @@
+import os
+import traceback
+from queue import Queue
+from threading import Thread, Lock, Semaphore, local
+
+from types_extensions import Function, void, safe_type, const, Number_t, list_type
+
+DEFAULT_POOL_SIZE: const(int) = max(32, (os.cpu_count() or 1) * 4)
+DEFAULT_QUEUE_DEPTH: const(int) = 4096
+
+
+class _PoolTask:
+    """
+    Do not use directly! Returned by GoPool.submit().
+    Mirrors the parts of the Thread API GoRoutine relies on: `finished` and join().
+    """
+
+    __slots__ = ('_call', 'finished', '_running')
+
+    def __init__(self, call: Function) -> void:
+        self._call: safe_type(Function) = call
+        self.finished: bool = False
+        # Held for as long as the task hasn't finished, which is cheaper than an Event
+        self._running: Lock = Lock()
+        self._running.acquire()
+
+    def run(self) -> void:
+        try:
+            self._call()
+        finally:
+            self._call = None
+            self.finished = True
+            self._running.release()
+
+    def join(self, timeout: Number_t = None) -> bool:
+        """
+        :return: True if the task finished within the timeout
+        """
+        if self.finished:
+            return True
+        if not self._running.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+        self._running.release()
+        return True
+
+
+class GoPool:
+    """
+    A bounded pool of worker threads to run goroutines on, instead of starting a new thread for each of them.
+    Workers are started lazily, only when there is no idle one, up to `size` of them. Submitted routines wait in a
+    queue of at most `queue_depth` entries, beyond which submit() blocks until a worker frees up (back-pressure).
+
+    Routines which block waiting for other routines (e.g. on a channel) occupy a worker while they wait, so a pool
+    needs at least as many workers as there are such routines running at the same time, or the routines they wait
+    for never get a worker. Start those without a pool (go()'s default) if there is no telling how many there will be.
+
+    Usage:
+
+    >>> with GoPool(size=8, queue_depth=1000) as pool:
+    >>>     routines = [go(fetch, None, url, pool=pool) for url in urls]
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, queue_depth: int = 0) -> void:
+        """
+        :param size: Maximum number of worker threads
+        :param queue_depth: Maximum number of routines waiting for a worker. 0 or less means unbounded.
+        """
+        if size < 1:
+            raise ValueError(f"A GoPool needs at least one worker, got {size=}")
+        self.size: const(int) = size
+        self.queue_depth: const(int) = queue_depth
+        self._queue: Queue = Queue(maxsize=queue_depth)
+        self._workers: list_type[Thread] = []
+        self._idle: Semaphore = Semaphore(0)
+        self._lock: Lock = Lock()
+        self._shutdown: bool = False
+        # Submitted tasks which haven't finished running yet, guarded by _lock
+        self._unfinished: int = 0
+        self._local: const(local) = local()
+
+    @property
+    def worker_count(self) -> int:
+        return len(self._workers)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _current_worker(self) -> safe_type(int):
+        """
+        :return: The index of the pool's worker running in the calling thread, if any
+        """
+        return getattr(self._local, 'index', None)
+
+    def _adjust_workers(self) -> void:
+        # The lock must be held
+        # An idle worker will pick the task up, no need for another one
+        if self._idle.acquire(blocking=False):
+            return
+        if len(self._workers) < self.size:
+            index = len(self._workers)
+            worker = Thread(target=self._work, args=(index,), name=f'GoPool-{id(self):x}-{index}', daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _stop_workers(self, count: int) -> void:
+        for _ in range(count):
+            self._queue.put(None)
+
+    def _work(self, index: int) -> void:
+        self._local.index = index
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            try:
+                task.run()
+            except Exception:
+                traceback.print_exc()
+            with self._lock:
+                self._unfinished -= 1
+                # The last task after shutdown() lets everyone go, since nothing can be submitted anymore
+                stop = self._shutdown and self._unfinished == 0
+                workers = len(self._workers)
+            if stop:
+                self._stop_workers(workers)
+            self._idle.release()
+
+    def submit(self, call: Function) -> _PoolTask:
+        """
+        Schedule a call on the pool. Blocks while the queue is full.
+        Calls made from the pool's own workers are still accepted after shutdown(), so that running routines can
+        start the routines they depend on.
+
+        :return: A handle exposing `finished` and join(timeout)
+        """
+        with self._lock:
+            if self._shutdown and self._current_worker() is None:
+                raise RuntimeError("Cannot submit to a GoPool which has been shut down")
+            self._unfinished += 1
+            self._adjust_workers()
+        task = _PoolTask(call)
+        self._queue.put(task)
+        return task
+
+    def shutdown(self, wait: bool = True) -> void:
+        """
+        Stop accepting routines from outside the pool and let the workers exit once every routine (including the ones
+        started by running routines meanwhile) has run.
+        When called from one of the pool's own routines, it never waits, since the workers can't exit before the
+        calling routine returns.
+        """
+        with self._lock:
+            if not self._shutdown:
+                self._shutdown = True
+                if self._unfinished == 0:
+                    self._stop_workers(len(self._workers))
+        if wait and self._current_worker() is None:
+            # Iterating over the list itself, since running routines may still start workers
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self) -> 'GoPool':
+        return self
+
+    def __exit__(self, *a, **k) -> void:
+        self.shutdown()
+
+    def __str__(self) -> str:
+        return f"GoPool(size={self.size}, workers={self.worker_count}, pending={self.pending})"
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+_default_pool: safe_type(GoPool) = None
+_default_pool_lock: const(Lock) = Lock()
+
+
+def default_pool() -> GoPool:
+    """
+    :return: A process-wide pool to share between the parts of an application, e.g. go(..., pool=default_pool()).
+    Created on first use.
+    """
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = GoPool(size=DEFAULT_POOL_SIZE, queue_depth=DEFAULT_QUEUE_DEPTH)
+    return _default_pool
+
+
+def set_default_pool(pool: GoPool) -> safe_type(GoPool):
+    """
+    Replace the process-wide pool, e.g. to size it for the application. The previous pool is not shut down.
+
+    :return: The previous default pool, if one was created
+    """
+    global _default_pool
+    with _default_pool_lock:
+        previous, _default_pool = _default_pool, pool
+    return previous
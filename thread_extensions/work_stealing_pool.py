@@ -0,0 +1,177 @@
+import random
+import time
+import traceback
+from collections import deque
+from threading import Thread, Lock, Condition
+
+from thread_extensions.goroutine_pool import GoPool, _PoolTask, DEFAULT_POOL_SIZE
+from types_extensions import Function, void, safe_type, const, Number_t, list_type
+
+
+class _StealingTask(_PoolTask):
+    """
+    Do not use directly! Returned by WorkStealingPool.submit().
+    Joining it from one of the pool's own workers runs other queued tasks while waiting, so parents waiting on their
+    subtasks never leave the pool without workers.
+    """
+
+    __slots__ = ('_pool',)
+
+    def __init__(self, call: Function, pool: 'WorkStealingPool') -> void:
+        super().__init__(call)
+        self._pool: const(WorkStealingPool) = pool
+
+    def run(self) -> void:
+        try:
+            super().run()
+        finally:
+            pool = self._pool
+            if pool._joiners:
+                with pool._wakeup:
+                    pool._wakeup.notify_all()
+
+    def join(self, timeout: Number_t = None) -> bool:
+        pool = self._pool
+        worker = pool._current_worker()
+        if worker is None:
+            return super().join(timeout)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while not self.finished:
+            task = pool._find_task(worker)
+            if task is not None:
+                pool._run(task)
+                continue
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return False
+            # Whatever we are waiting for is being run by another worker. Sleep until some task finishes (run()
+            # wakes up joiners) or a new task shows up which we can help with.
+            with pool._wakeup:
+                pool._joiners += 1
+                pool._sleepers += 1
+                if not self.finished and not pool._has_tasks():
+                    pool._wakeup.wait(remaining)
+                pool._sleepers -= 1
+                pool._joiners -= 1
+        return True
+
+
+class WorkStealingPool(GoPool):
+    """
+    A pool where every worker has its own deque of tasks. Tasks submitted from a worker (subtasks) are pushed to
+    that worker's deque, which it works through newest first, while idle workers steal the oldest tasks from the
+    other end of their peers' deques. Tasks submitted from outside the pool go through a shared injection deque.
+    This keeps every worker busy when task durations are skewed, and suits divide-and-conquer work where tasks spawn
+    and then join their subtasks (joining from a worker runs queued tasks instead of blocking it).
+
+    It can be passed to go() like any GoPool. The queue is unbounded and all workers are started upfront.
+
+    Usage:
+
+    >>> pool = WorkStealingPool(size=8)
+    >>>
+    >>> def tree_sum(node) -> int:
+    >>>     subtasks = [pool.submit(functools.partial(tree_sum, child)) for child in node.children]
+    >>>     ...
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE) -> void:
+        super().__init__(size=size, queue_depth=0)
+        self._deques: const(list_type[deque[_StealingTask]]) = [deque() for _ in range(size)]
+        self._injector: const(deque[_StealingTask]) = deque()
+        self._wakeup: const(Condition) = Condition(Lock())
+        # Workers waiting on the condition, and how many of them are joining a task
+        self._sleepers: int = 0
+        self._joiners: int = 0
+        for index in range(size):
+            worker = Thread(target=self._work, args=(index,), name=f'WorkStealingPool-{id(self):x}-{index}',
+                            daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._injector) + sum(len(deque_) for deque_ in self._deques)
+
+    def _find_task(self, index: int) -> safe_type(_StealingTask):
+        try:
+            return self._deques[index].pop()
+        except IndexError:
+            pass
+        try:
+            return self._injector.popleft()
+        except IndexError:
+            pass
+        offset = random.randrange(self.size)
+        for i in range(self.size):
+            victim = (offset + i) % self.size
+            if victim == index:
+                continue
+            try:
+                return self._deques[victim].popleft()
+            except IndexError:
+                pass
+        return
+
+    def _has_tasks(self) -> bool:
+        return bool(self._injector) or any(self._deques)
+
+    @staticmethod
+    def _run(task: _StealingTask) -> void:
+        try:
+            task.run()
+        except Exception:
+            traceback.print_exc()
+
+    def _work(self, index: int) -> void:
+        self._local.index = index
+        while True:
+            task = self._find_task(index)
+            if task is not None:
+                self._run(task)
+                continue
+            with self._wakeup:
+                # Announce the nap before the last look, so a concurrent submit() either sees a sleeper to wake up
+                # or has its task found here
+                self._sleepers += 1
+                if not self._has_tasks():
+                    if self._shutdown:
+                        self._sleepers -= 1
+                        return
+                    self._wakeup.wait()
+                self._sleepers -= 1
+
+    def submit(self, call: Function) -> _StealingTask:
+        """
+        Schedule a call on the pool. Calls made from one of the pool's workers go to that worker's own deque, and are
+        still accepted after shutdown() so that running tasks can finish splitting their work.
+
+        :return: A handle exposing `finished` and join(timeout)
+        """
+        index = self._current_worker()
+        if self._shutdown and index is None:
+            raise RuntimeError("Cannot submit to a WorkStealingPool which has been shut down")
+        task = _StealingTask(call, self)
+        if index is not None:
+            self._deques[index].append(task)
+        else:
+            self._injector.append(task)
+        if self._sleepers:
+            with self._wakeup:
+                self._wakeup.notify()
+        return task
+
+    def shutdown(self, wait: bool = True) -> void:
+        """
+        Stop accepting tasks from outside the pool and let the workers exit once every queued task (including the
+        subtasks they spawn meanwhile) has run.
+        """
+        with self._wakeup:
+            self._shutdown = True
+            self._wakeup.notify_all()
+        if wait and self._current_worker() is None:
+            for worker in self._workers:
+                worker.join()
+
+    def __str__(self) -> str:
+        return f"WorkStealingPool(size={self.size}, pending={self.pending})"